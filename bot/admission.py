@@ -0,0 +1,76 @@
+import threading
+import time
+from typing import Callable
+from .logger import logger
+from .ratelimit import SlidingWindowLimiter
+
+
+# Решения по входящему апдейту
+ADMIT = 0  # обработать
+THROTTLED = 1  # превышен лимит пользователя: ответить коротким предупреждением, хендлеры не вызывать
+DROP = 2  # отбросить молча
+
+
+class AdmissionControl:
+    """Допуск апдейтов к хендлерам, до постановки в очередь диспетчера.
+
+    - админы (exempt) проходят всегда, их кнопки модерации не тормозятся;
+    - у остальных не больше rate_limit апдейтов за window секунд
+      (SlidingWindowLimiter). На первый лишний апдейт пользователь получает
+      предупреждение (THROTTLED), дальше апдейты отбрасываются молча;
+    - всего в очереди не больше max_pending апдейтов: сверх этого апдейты
+      не-админов отбрасываются, чтобы при перегрузке очередь не росла.
+    Диспетчер вызывает check() при получении апдейта и done() после обработки
+    каждого допущенного (ADMIT / THROTTLED).
+    """
+
+    def __init__(self, exempt: Callable[[int], bool], rate_limit: int = 20, window: float = 10,
+                 max_pending: int = 1000, maxsize: int = 100000):
+        self.exempt = exempt
+        self.max_pending = max_pending
+        self.limiter = SlidingWindowLimiter(rate_limit, window, maxsize=maxsize)
+        self._pending = 0
+        self._shed = 0
+        self._shed_logged_at = 0.0
+        self._lock = threading.Lock()
+
+    def check(self, user_id: int) -> int:
+        if self.exempt(user_id):
+            self._enter()
+            return ADMIT
+
+        with self._lock:
+            overloaded = self._pending >= self.max_pending
+            if overloaded:
+                self._shed += 1
+        if overloaded:
+            self._log_shed()
+            return DROP
+
+        rejected = self.limiter.hit(user_id)
+        if rejected > 1:
+            return DROP
+        self._enter()
+        return THROTTLED if rejected else ADMIT
+
+    def done(self):
+        with self._lock:
+            self._pending -= 1
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _enter(self):
+        with self._lock:
+            self._pending += 1
+
+    def _log_shed(self):
+        # при перегрузке не больше одной строки в лог за 10 секунд
+        now = time.monotonic()
+        with self._lock:
+            if now - self._shed_logged_at < 10:
+                return
+            self._shed_logged_at = now
+            shed, self._shed = self._shed, 0
+        logger.warning(f"Admission: inbound queue is full ({self.max_pending}), {shed} updates shed")
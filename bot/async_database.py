@@ -0,0 +1,37 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+from .database import Database
+
+
+class AsyncDatabase:
+    """Асинхронная обертка над Database для bot.async_main.
+
+    Любой метод Database вызывается как корутина и выполняется в отдельном
+    пуле потоков, размер которого совпадает с пулом соединений SQLite,
+    поэтому запросы к БД не блокируют event loop. Так же оборачивается
+    любой объект с синхронным API поверх БД (StateStore), с общим executor.
+    """
+
+    def __init__(self, db: Database, executor: Optional[ThreadPoolExecutor] = None):
+        self.db = db
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=db.pool.size,
+            thread_name_prefix="db",
+        )
+
+    async def run(self, func, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.db, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+
+        call.__name__ = name
+        return call
@@ -0,0 +1,707 @@
+"""Асинхронный рантайм бота: python -m bot.async_main
+
+Те же сценарии, что и в bot.main, но на event loop (AsyncTeleBot).
+Запросы к SQLite идут через AsyncDatabase (пул потоков), клавиатуры и
+тексты общие с bot.main (bot.keyboards, bot.render).
+Рассылка и действия после решения модерации - фоновые задачи, поэтому
+они работают теми же BroadcastEngine / ModerationPipeline на синхронном
+клиенте в потоках.
+Прием апдейтов только через polling.
+"""
+import asyncio
+from typing import Optional
+import telebot
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+# относительные импорты
+from .logger import logger
+from .config import settings, messages
+from .database import db as sync_db
+from .async_database import AsyncDatabase
+from .cache import TTLCache
+from .broadcast import BroadcastEngine
+from .errors import is_unreachable
+from .state import create_state_store
+from .router import Router
+from .outbound import OutboundScheduler
+from .dispatcher import AsyncShardedDispatcher
+from .admission import AdmissionControl
+from .transport import HttpTransport
+from .moderation import ModerationPipeline, decision_tasks
+from .publisher import PublishScheduler
+from .keyboards import (
+    get_subscription_keyboard, get_main_keyboard, get_photo_skip_keyboard, get_anonymity_keyboard,
+    get_confirmation_keyboard, get_back_keyboard, get_moderation_keyboard, get_queue_keyboard,
+)
+from . import render
+
+logger.info("async bot started")
+
+# Инициализация
+bot = AsyncTeleBot(settings.bot_token)
+# флуд одного пользователя и перегрузка отсекаются до хендлеров, админы - без ограничений
+# (проверка админа - только по кешу в памяти, его обновляет refresh_acl_periodically)
+admission = AdmissionControl(
+    exempt=sync_db.is_admin_cached,
+    rate_limit=settings.flood_rate_limit,
+    window=settings.flood_window,
+    max_pending=settings.inbound_max_pending,
+)
+# апдейты одного пользователя - по порядку, разных - параллельно
+dispatcher = AsyncShardedDispatcher(
+    bot,
+    workers=settings.update_workers,
+    queue_size=settings.update_queue_size,
+    admission=admission,
+)
+dispatcher.install()
+db = AsyncDatabase(sync_db)
+# рассылка и действия после модерации работают в своих потоках через синхронный клиент;
+# его запросы идут через общий планировщик лимитов (AsyncTeleBot - напрямую)
+# и одну HTTP сессию: рассылка, пайплайн модерации с правкой копий и публикация
+transport = HttpTransport(
+    pool_size=settings.http_pool_size or (settings.broadcast_workers + settings.moderation_workers + 8 + 1),
+    connect_timeout=settings.http_connect_timeout,
+    read_timeout=settings.http_read_timeout,
+    long_polling_timeout=settings.long_polling_timeout,
+)
+transport.install()
+outbound = OutboundScheduler(
+    global_rate=settings.outbound_global_rate,
+    chat_rate=settings.outbound_chat_rate,
+    group_rate=settings.outbound_group_rate,
+)
+outbound.install()
+sync_bot = telebot.TeleBot(settings.bot_token, threaded=False)
+broadcast_engine = BroadcastEngine(
+    sync_bot, sync_db,
+    rate=settings.broadcast_rate,
+    workers=settings.broadcast_workers,
+)
+moderation_pipeline = ModerationPipeline(
+    sync_bot, sync_db,
+    workers=settings.moderation_workers,
+    max_attempts=settings.moderation_max_attempts,
+)
+# Одобренные посты выходят в канал из publish_queue в своем темпе
+publisher = PublishScheduler(
+    sync_bot, sync_db,
+    channel=settings.channel_username_publish,
+    interval=settings.publish_interval,
+    slots=settings.publish_slots,
+    rate=settings.channel_publish_rate,
+    max_attempts=settings.moderation_max_attempts,
+)
+
+# Состояние диалога и черновик поста по user_id
+state_store = create_state_store(
+    settings.state_backend, sync_db,
+    ttl=settings.draft_ttl,
+    maxsize=settings.state_max_users,
+)
+
+# в async рантайме хранилище вызывается через пул потоков БД, как и сама БД
+# (state_backend=sqlite - запросы к SQLite не блокируют event loop)
+states = AsyncDatabase(state_store, executor=db.executor)
+
+# Текстовые кнопки и состояния FSM -> хендлеры (см. dispatch_message)
+router = Router(messages)
+messages.on_reload(router.rebuild)
+
+# Кеш проверки подписки: user_id -> кортеж каналов, на которые нужно подписаться
+subscription_cache = TTLCache(
+    maxsize=settings.subscription_cache_size,
+    ttl=settings.subscription_cache_ttl,
+)
+
+async def is_channel_member(channel: str, user_id: int) -> bool:
+    try:
+        member = await bot.get_chat_member(f"@{channel}", user_id)
+        return member.status in ['member', 'administrator', 'creator']
+    except Exception as e:
+        logger.warning(f"Не удалось проверить подписку {user_id} на @{channel}: {e}")
+        return False
+
+# Проверка подписки на канал
+async def check_subscriptions(user_id: int, fresh: bool = False) -> list[str]:
+    """Возвращает каналы, на которые пользователь не подписан.
+    fresh=True игнорирует кеш (явное нажатие «Проверить»)
+    """
+    if fresh:
+        subscription_cache.pop(user_id)
+    else:
+        cached = subscription_cache.get(user_id)
+        if cached is not None:
+            return list(cached)
+
+    channels = settings.channel_usernames
+    results = await asyncio.gather(*(is_channel_member(channel, user_id) for channel in channels))
+
+    need_to_subscribe_channels = [channel for channel, ok in zip(channels, results) if not ok]
+    # отрицательный результат живет недолго, чтобы подписавшийся быстро прошел проверку
+    ttl = settings.subscription_negative_ttl if need_to_subscribe_channels else settings.subscription_cache_ttl
+    subscription_cache.set(user_id, tuple(need_to_subscribe_channels), ttl=ttl)
+    return need_to_subscribe_channels
+
+# Уведомления пользователям
+async def notify_user(user_id: int, text: str) -> bool:
+    """Отправить уведомление. Заблокировавших бота пропускаем и помечаем в БД"""
+    if await db.is_user_unreachable(user_id):
+        return False
+    try:
+        await bot.send_message(user_id, text)
+        return True
+    except Exception as e:
+        if is_unreachable(e):
+            await db.mark_user_unreachable(user_id)
+            logger.info(f"User {user_id} is unreachable, marked in DB")
+        else:
+            logger.warning(f"Не удалось уведомить пользователя {user_id}: {e}")
+        return False
+
+
+# ===COMMANDS HANDLERS===
+@bot.message_handler(commands=['start'])
+async def start_handler(message: types.Message):
+    user_id = message.from_user.id
+    username = message.from_user.username
+    first_name = message.from_user.first_name
+
+    # Сначала добавляем/обновляем пользователя
+    if await db.add_user(user_id, username, first_name):
+        logger.info(f"New user added: @{username}")
+
+    # ЗАТЕМ проверяем бан
+    if await db.is_user_banned(user_id):
+        await bot.send_message(user_id, messages.get('moderation.user_banned_notification'))
+        return
+
+    # Затем проверяем подписку
+    not_subscribed_channels = await check_subscriptions(user_id)
+    if not_subscribed_channels:
+        await bot.send_message(
+            message.chat.id,
+            messages.get('subscription.check_required'),
+            reply_markup=get_subscription_keyboard(not_subscribed_channels),
+            parse_mode="HTML",
+        )
+        return
+
+    # Отправляем главное меню
+    await bot.send_message(message.chat.id, messages.get('welcome.greeting'),
+                           reply_markup=get_main_keyboard())
+
+@bot.message_handler(commands=['admin'])
+async def admin_handler(message: types.Message):
+    if not await db.is_admin(message.from_user.id):
+        await bot.send_message(message.chat.id, messages.get('admin_commands.not_admin'))
+        return
+
+    await bot.send_message(message.chat.id, messages.get('admin_commands.admin_help'))
+
+@bot.message_handler(commands=['ban'])
+async def ban_handler(message: types.Message):
+    if not await db.is_admin(message.from_user.id):
+        return
+
+    try:
+        args = message.text.split()[1:]
+        if not args:
+            await bot.send_message(message.chat.id, "Укажите ID")
+            return
+
+        target_id = int(args[0])
+        await db.ban_user(target_id)
+
+        # Уведомляем админов
+        await bot.send_message(
+            message.chat.id,
+            messages.get('moderation.user_banned_admin', user=target_id)
+        )
+
+        logger.info(f"User with id: {target_id} was banned")
+
+        # Уведомляем пользователя
+        await notify_user(target_id, messages.get('moderation.user_banned_notification'))
+
+    except (ValueError, IndexError) as e:
+        await bot.send_message(message.chat.id, "Неверный формат. Используйте: /ban ID")
+        await bot.send_message(message.chat.id, f"ошибка {e}")
+
+@bot.message_handler(commands=['unban'])
+async def unban_handler(message: types.Message):
+    if not await db.is_admin(message.from_user.id):
+        return
+
+    try:
+        args = message.text.split()[1:]
+        if not args:
+            await bot.send_message(message.chat.id, "Укажите ID пользователя")
+            return
+
+        target_id = int(args[0])
+        await db.unban_user(target_id)
+
+        # Уведомляем админов
+        await bot.send_message(
+            message.chat.id,
+            messages.get('moderation.user_unbanned_admin', user=target_id)
+        )
+
+        logger.info(f"User with id: {target_id} was UNbanned")
+
+        # Уведомляем пользователя
+        await notify_user(target_id, messages.get('moderation.user_unbanned_notification'))
+
+    except (ValueError, IndexError):
+        await bot.send_message(message.chat.id, "Неверный формат. Используйте: /unban ID")
+
+@bot.message_handler(commands=['stats'])
+async def stats_handler(message: types.Message):
+    if not await db.is_admin(message.from_user.id):
+        return
+
+    stats, daily = await asyncio.gather(db.get_stats(), db.get_daily_stats())
+    await bot.send_message(message.chat.id, render.stats_text(stats, daily))
+
+@bot.message_handler(commands=['queue'])
+async def queue_handler(message: types.Message):
+    if not await db.is_admin(message.from_user.id):
+        return
+
+    text, markup = await queue_page()
+    await bot.send_message(message.chat.id, text, reply_markup=markup)
+
+@bot.message_handler(commands=['pubqueue'])
+async def publish_queue_handler(message: types.Message):
+    if not await db.is_admin(message.from_user.id):
+        return
+
+    posts, total = await asyncio.gather(db.get_publish_queue(limit=settings.queue_page_size),
+                                        db.get_publish_queue_size())
+    await bot.send_message(message.chat.id, render.publish_queue_text(
+        posts, total, publisher.next_publish_at(posts[0] if posts else None)))
+
+@bot.message_handler(commands=['pubmove'])
+async def publish_move_handler(message: types.Message):
+    if not await db.is_admin(message.from_user.id):
+        return
+
+    try:
+        post_id, position = (int(arg) for arg in message.text.split()[1:3])
+    except ValueError:
+        await bot.send_message(message.chat.id, messages.get('publish_queue.move_usage'))
+        return
+
+    if not await db.move_publication(post_id, position):
+        await bot.send_message(message.chat.id, messages.get('publish_queue.not_found', post_id=post_id))
+        return
+    publisher.wake()
+    await bot.send_message(message.chat.id,
+                           messages.get('publish_queue.moved', post_id=post_id, position=max(position, 1)))
+
+@bot.message_handler(commands=['rasil'])
+async def broadcast_handler(message: types.Message):
+    if not await db.is_admin(message.from_user.id):
+        return
+
+    try:
+        args = message.text.split()[1:]
+        # необязательный сегмент: /rasil active=7 текст - только активным за 7 дней
+        active_days = None
+        if args and args[0].startswith('active='):
+            active_days = int(args.pop(0).split('=', 1)[1])
+
+        broadcast_text = ' '.join(args)
+        if not broadcast_text:
+            await bot.send_message(message.chat.id, "Введите текст для рассылки")
+            return
+
+        if broadcast_engine.running:
+            await bot.send_message(message.chat.id, messages.get('broadcast.already_running'))
+            return
+
+        await bot.send_message(
+            message.chat.id,
+            messages.get('broadcast.starting', message_text=broadcast_text)
+        )
+
+        # Рассылка идет в фоновых потоках, прогресс приходит отдельным сообщением
+        job = await db.run(broadcast_engine.start, message.chat.id, broadcast_text, active_days)
+        if job is None:
+            await bot.send_message(message.chat.id, messages.get('broadcast.already_running'))
+
+    except Exception as e:
+        await bot.send_message(message.chat.id, f"Ошибка: {str(e)}")
+
+@bot.message_handler(commands=['stoprasil'])
+async def stop_broadcast_handler(message: types.Message):
+    if not await db.is_admin(message.from_user.id):
+        return
+
+    if broadcast_engine.cancel():
+        await bot.send_message(message.chat.id, messages.get('broadcast.stopping'))
+    else:
+        await bot.send_message(message.chat.id, messages.get('broadcast.not_running'))
+
+
+@router.button('buttons.support')
+async def support_handler(message: types.Message):
+    await bot.send_message(
+        message.chat.id,
+        messages.get('support.message'),
+        reply_markup=get_main_keyboard()
+    )
+
+@router.button('buttons.write_post')
+async def create_post_handler(message: types.Message):
+    user_id = message.from_user.id
+
+    # Проверяем бан
+    if await db.is_user_banned(user_id):
+        await bot.send_message(message.chat.id, messages.get('moderation.user_banned_notification'))
+        return
+
+    await states.set(user_id, "waiting_for_text")
+
+    await bot.send_message(
+        message.chat.id,
+        messages.get('post_creation.write_description'),
+        reply_markup=get_back_keyboard()
+    )
+
+@router.button('buttons.back')
+async def back(message: types.Message):
+    await start_handler(message)
+
+@router.button('buttons.skip_media')
+async def skip_photo_handler(message: types.Message):
+    user_id = message.from_user.id
+    if await states.get_state(user_id) != "waiting_for_media":
+        return
+
+    await states.update(user_id, "waiting_for_anonymity", has_photo=False, photo_file_id=None)
+
+    await bot.send_message(
+        message.chat.id,
+        messages.get('post_creation.choose_anonymity'),
+        reply_markup=get_anonymity_keyboard()
+    )
+
+@router.button('buttons.anonymous', 'buttons.leave_contact')
+async def anonymity_handler(message: types.Message):
+    user_id = message.from_user.id
+    if await states.get_state(user_id) != "waiting_for_anonymity":
+        return
+
+    if message.text == messages.get('buttons.leave_contact'):
+        if not message.from_user.username:
+            await bot.send_message(
+                message.chat.id,
+                messages.get('post_creation.no_username'),
+                reply_markup=get_anonymity_keyboard()
+            )
+            return
+        data = await states.update(user_id, is_anonymous=False)
+    else:
+        data = await states.update(user_id, is_anonymous=True)
+
+    # Показываем превью поста
+    await show_post_preview(message.chat.id, user_id, data)
+
+@router.button('buttons.yes_send')
+async def confirm_post_handler(message: types.Message):
+    user_id = message.from_user.id
+    data = await states.get_data(user_id)
+
+    if not data:
+        return
+
+    # Создаем пост в базе
+    post_id = await db.create_post(
+        user_id=user_id,
+        text_content=data["text"],
+        has_photo=data.get('has_photo', False),
+        has_video=data.get('has_video', False),
+        photo_file_id=data.get("photo_file_id"),
+        video_file_id=data.get("video_file_id"),
+        is_anonymous=data["is_anonymous"],
+        author_username=message.from_user.username,
+        author_first_name=message.from_user.first_name,
+    )
+
+    await bot.send_message(
+        message.chat.id,
+        messages.get('post_creation.sent_for_review', post_id=post_id),
+        reply_markup=get_main_keyboard()
+    )
+
+    # Отправляем админам на модерацию
+    await send_to_moderation(post_id)
+
+    # Очищаем данные пользователя
+    await states.clear(user_id)
+
+@router.button('buttons.no_restart')
+async def restart_post_handler(message: types.Message):
+    user_id = message.from_user.id
+    await states.set(user_id, "waiting_for_text")
+
+    await bot.send_message(
+        message.chat.id,
+        messages.get('post_creation.write_description'),
+        reply_markup=get_back_keyboard(),
+    )
+
+async def reply_subscription_status(chat_id: int, user_id: int):
+    not_subscribed_channels = await check_subscriptions(user_id, fresh=True)
+    if not not_subscribed_channels:
+        await bot.send_message(chat_id, messages.get('welcome.greeting'), reply_markup=get_main_keyboard())
+    else:
+        await bot.send_message(
+            chat_id,
+            messages.get('subscription.not_subscribed'),
+            reply_markup=get_subscription_keyboard(not_subscribed_channels)
+        )
+
+@router.button('buttons.check_subscription')
+async def check_subscription_message_handler(message: types.Message):
+    await reply_subscription_status(message.chat.id, message.from_user.id)
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith('check_'))
+async def check_subscription_handler(call: types.CallbackQuery):
+    await reply_subscription_status(call.message.chat.id, call.from_user.id)
+
+async def decide_post(call: types.CallbackQuery, status: str):
+    """Общая часть approve_handler / reject_handler"""
+    if not await db.is_admin(call.from_user.id):
+        await bot.answer_callback_query(call.id, "У вас нет прав администратора")
+        return
+
+    # Извлекаем post_id из callback_data
+    post_id = int(call.data.split('_')[1])
+    admin_id = call.from_user.id
+    admin_username = call.from_user.username or str(admin_id)
+
+    # Обновляем статус поста, только если решения еще нет (двойное нажатие,
+    # два админа); правка заявки и уведомление автора ставятся в очередь той же
+    # транзакцией, одобренный пост - в очередь публикации, все выполняется в фоне
+    tasks = decision_tasks(post_id, status, admin_username, call.message)
+    decide = db.approve_post if status == "approved" else db.reject_post
+    if not await decide(post_id, admin_id, tasks=tasks):
+        post = await db.get_post(post_id)
+        await bot.answer_callback_query(call.id, "Пост не найден" if not post else "Заявка уже обработана")
+        return
+    moderation_pipeline.wake()
+    publisher.wake()
+
+    # Отвечаем на callback
+    await bot.answer_callback_query(call.id, "Пост одобрен" if status == "approved" else "Пост отклонен")
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith('approve_'))
+async def approve_handler(call: types.CallbackQuery):
+    await decide_post(call, "approved")
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith('reject_'))
+async def reject_handler(call: types.CallbackQuery):
+    await decide_post(call, "rejected")
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith('queue_'))
+async def queue_callback_handler(call: types.CallbackQuery):
+    if not await db.is_admin(call.from_user.id):
+        await bot.answer_callback_query(call.id, "У вас нет прав администратора")
+        return
+
+    # queue_next_<last_id> / queue_approve_<first_id>_<last_id> / queue_reject_<first_id>_<last_id>
+    action, *ids = call.data.split('_')[1:]
+    last_id = int(ids[-1])
+
+    if action == "next":
+        await bot.answer_callback_query(call.id)
+    else:
+        status = "approved" if action == "approve" else "rejected"
+        admin_username = call.from_user.username or str(call.from_user.id)
+        # вся страница одной транзакцией; уже обработанные посты пропускаются,
+        # правки и уведомления идут в фоне, одобренные посты - в очередь публикации
+        decided = await db.decide_pending_posts(
+            int(ids[0]), last_id, status, call.from_user.id,
+            tasks_for=lambda post_id: decision_tasks(post_id, status, admin_username),
+        )
+        moderation_pipeline.wake()
+        publisher.wake()
+        await bot.answer_callback_query(call.id, messages.get(f'queue.{status}', count=len(decided)))
+
+    text, markup = await queue_page(after_id=last_id)
+    try:
+        await bot.edit_message_text(text, call.message.chat.id, call.message.message_id, reply_markup=markup)
+    except Exception as e:
+        logger.warning(f"Не удалось обновить страницу очереди: {e}")
+
+
+# ===STATE HANDLERS===
+@router.state('waiting_for_text', content_types=['text', 'photo', 'video', 'document', 'audio', 'voice', 'sticker'])
+async def handle_post_text(message: types.Message):
+    user_id = message.from_user.id
+
+    # if not a text message telling user that he needs to send text
+    if message.content_type != "text":
+        await bot.send_message(message.chat.id, messages.get('post_creation.no_text_warning'))
+        return
+
+    await states.update(user_id, "waiting_for_media", text=message.text)
+
+    await bot.send_message(
+        message.chat.id,
+        messages.get('post_creation.add_photo'),
+        reply_markup=get_photo_skip_keyboard(),
+    )
+
+@router.state('waiting_for_media', content_types=['photo', 'video'])
+async def handle_post_media(message: types.Message):
+    user_id = message.from_user.id
+
+    # handling two types of media (the other media type is reset)
+    if message.content_type == "photo":
+        media = dict(has_photo=True, photo_file_id=message.photo[-1].file_id, has_video=False)
+    else:
+        media = dict(has_video=True, video_file_id=message.video.file_id, has_photo=False)
+
+    await states.update(user_id, "waiting_for_anonymity", **media)
+
+    await bot.send_message(
+        message.chat.id,
+        messages.get('post_creation.choose_anonymity'),
+        reply_markup=get_anonymity_keyboard()
+    )
+
+
+# Все кнопки и состояния FSM обрабатываются одним хендлером после команд
+async def dispatch_message(message: types.Message):
+    handler = router.resolve_button(message)
+    if handler is None and router.has_states:
+        handler = router.resolve_state(message, await states.get_state(message.from_user.id))
+    if handler is not None:
+        await handler(message)
+
+bot.register_message_handler(dispatch_message, content_types=router.content_types)
+
+# ===HELPERS===
+async def show_post_preview(chat_id: int, user_id: int, data: dict):
+    username = (await bot.get_chat(user_id)).username if not data["is_anonymous"] else None
+
+    text = render.preview_text(data, username)
+
+    if data.get('has_photo', False):
+        await bot.send_photo(chat_id, data["photo_file_id"], caption=text,
+                             reply_markup=get_confirmation_keyboard())
+    elif data.get("has_video", False):
+        await bot.send_video(chat_id, data["video_file_id"], caption=text,
+                             reply_markup=get_confirmation_keyboard())
+    else:
+        await bot.send_message(chat_id, text, reply_markup=get_confirmation_keyboard(), parse_mode='HTML')
+
+async def queue_page(after_id: Optional[int] = None):
+    """Текст и кнопки страницы /queue после поста after_id"""
+    posts = await db.get_pending_posts(after_id, limit=settings.queue_page_size + 1)
+    if not posts:
+        return messages.get('queue.empty'), None
+    has_more = len(posts) > settings.queue_page_size
+    posts = posts[:settings.queue_page_size]
+    return render.queue_text(posts), get_queue_keyboard(posts[0]['id'], posts[-1]['id'], has_more)
+
+async def send_to_moderation(post_id: int):
+    post = await db.get_post(post_id)
+    if not post:
+        return
+
+    # тексты рендерятся один раз и сохраняются в посте (правки и публикация берут их оттуда)
+    moderation_text = render.moderation_text(post)
+    await db.set_post_texts(post_id, moderation_text, render.channel_text(post))
+
+    if settings.moderation_mode == "direct":
+        # каждому админу в личку, одновременно
+        admin_chats = await db.get_all_admins()
+    else:
+        admin_chats = [f"@{settings.group_username}"]
+
+    sent = await asyncio.gather(*(send_application(chat, post, moderation_text) for chat in admin_chats))
+
+    # все копии заявки обновятся после решения (см. ModerationPipeline)
+    await db.add_moderation_messages(post_id, [
+        (message.chat.id, message.message_id, bool(post["has_photo"] or post["has_video"]))
+        for message in sent if message is not None
+    ])
+
+async def send_application(chat, post: dict, moderation_text: str) -> Optional[types.Message]:
+    """Отправить заявку в один чат. None если не получилось"""
+    keyboard = get_moderation_keyboard(post["id"])
+    try:
+        if post["has_photo"]:
+            return await bot.send_photo(chat, post["photo_file_id"], caption=moderation_text, reply_markup=keyboard)
+        elif post['has_video']:
+            return await bot.send_video(chat, post["video_file_id"], caption=moderation_text, reply_markup=keyboard)
+        else:
+            return await bot.send_message(chat, moderation_text, reply_markup=keyboard)
+    except Exception as e:
+        logger.error(f"Ошибка при отправке на модерацию в {chat}: {e}")
+        return None
+
+
+async def refresh_acl_periodically():
+    """Кеш админов для admission обновляется в пуле потоков БД, не в event loop"""
+    while True:
+        try:
+            await db.refresh_acl()
+        except Exception as e:
+            logger.error(f"Не удалось обновить кеш ACL: {e}")
+        await asyncio.sleep(sync_db.acl_refresh_interval)
+
+async def run():
+    for i in settings.admin_ids:
+        await db.add_admin(i, added_by="auto_add_in_script")
+        logger.info(f"Admin with ID: {i} was registered(SCRIPT)")
+
+    # продолжаем рассылки, прерванные перезапуском
+    await db.run(broadcast_engine.resume_unfinished)
+
+    # задачи обработки апдейтов (нужен работающий event loop)
+    dispatcher.start()
+    acl_refresh_task = asyncio.create_task(refresh_acl_periodically())
+
+    # решения модерации, не доделанные до перезапуска, выполняются сейчас
+    moderation_pipeline.start()
+
+    # одобренные посты выходят в канал по очереди (интервал / слоты)
+    publisher.start()
+
+    # счетчики соединений синхронного клиента к Bot API - в лог
+    transport.start_stats_log()
+
+    # брошенные черновики постов удаляются по расписанию
+    state_store.start_expiry()
+
+    # last_activity известных пользователей пишется пачками
+    if settings.activity_flush_interval > 0:
+        sync_db.start_activity_buffer(settings.activity_flush_interval, settings.activity_known_users)
+
+    if settings.run_mode == "webhook":
+        logger.warning("bot.async_main supports only polling, run_mode=webhook is ignored")
+
+    # polling не работает, пока зарегистрирован webhook
+    await bot.remove_webhook()
+    try:
+        await bot.polling(non_stop=True, timeout=settings.long_polling_timeout)
+    finally:
+        await bot.close_session()
+
+def main():
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        logger.error(f"ERROR: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Бенчмарк слоя соединений Database: пул долгоживущих соединений (сейчас)
+против нового sqlite3.connect на каждый вызов (как было до пула).
+
+    python -m bot.benchmarks.database [ops]
+
+Обе базы создаются во временной папке, результат - микросекунды на операцию.
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+# модульный bot.database.db не должен создавать bot.db в текущей папке
+_tmp = tempfile.mkdtemp(prefix="bench-db-")
+os.environ.setdefault("DB_PATH", os.path.join(_tmp, "module.db"))
+
+from bot.database import Database  # noqa: E402
+
+
+class FreshConnectionDatabase(Database):
+    """Как до пула: новое соединение на каждый вызов, без прагм"""
+
+    @contextmanager
+    def connection(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+def _bench(db: Database, ops: int) -> dict:
+    post_ids = [db.create_post(1, "warmup") for _ in range(10)]
+    cases = {
+        'add_user': lambda i: db.add_user(i % 500, "user", "First"),
+        'get_user': lambda i: db.get_user(i % 500),
+        'create_post': lambda i: db.create_post(i % 500, "text"),
+        'get_post': lambda i: db.get_post(post_ids[i % len(post_ids)]),
+        'get_stats': lambda i: db.get_stats(),
+    }
+    results = {}
+    for name, case in cases.items():
+        started = time.perf_counter()
+        for i in range(ops):
+            case(i)
+        results[name] = (time.perf_counter() - started) / ops * 1e6
+    return results
+
+
+def main():
+    ops = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    before_db = FreshConnectionDatabase(os.path.join(_tmp, "before.db"))
+    after_db = Database(os.path.join(_tmp, "after.db"))
+    before = _bench(before_db, ops)
+    after = _bench(after_db, ops)
+    after_db.close()
+
+    print(f"{ops} ops each, us/op (new connection per call -> pool)")
+    for name in before:
+        print(f"  {name:<12} {before[name]:8.0f} -> {after[name]:6.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Микробенчмарк выбора хендлера: Router (dict кнопок + одно чтение состояния)
+против прежней цепочки message_handler(func=lambda ...), которую telebot
+проверяет по порядку до первого совпадения.
+
+    python -m bot.benchmarks.router [updates]
+
+Меряется только выбор хендлера, без самих хендлеров. Нужны настройки
+бота (bot/.env), как и для запуска самого бота.
+"""
+import json
+import sys
+import time
+from typing import Callable, List, Tuple
+from telebot import types
+from bot.config import messages
+from bot.router import Router
+
+# кнопки в порядке регистрации в bot.main
+BUTTONS = [
+    ('buttons.support',),
+    ('buttons.write_post',),
+    ('buttons.back',),
+    ('buttons.skip_media',),
+    ('buttons.anonymous', 'buttons.leave_contact'),
+    ('buttons.yes_send',),
+    ('buttons.no_restart',),
+    ('buttons.check_subscription',),
+]
+STATES = [
+    ('waiting_for_text', ['text', 'photo', 'video', 'document', 'audio', 'voice', 'sticker']),
+    ('waiting_for_media', ['photo', 'video']),
+]
+
+
+def _handler():
+    pass
+
+
+def build_filter_chain(get_state: Callable[[int], str]) -> List[Tuple[List[str], Callable]]:
+    """Фильтры в том виде, в каком они были до Router: текст кнопки каждый раз из каталога"""
+    chain = []
+    for paths in BUTTONS:
+        if len(paths) == 1:
+            chain.append((['text'], lambda m, path=paths[0]: m.text == messages.get(path)))
+        else:
+            chain.append((['text'], lambda m, paths=paths: m.text in [messages.get(p) for p in paths]))
+    for state, content_types in STATES:
+        chain.append((content_types, lambda m, state=state: get_state(m.from_user.id) == state))
+    return chain
+
+
+def resolve_chain(chain, message: types.Message):
+    for content_types, func in chain:
+        if message.content_type in content_types and func(message):
+            return _handler
+    return None
+
+
+def build_router(get_state: Callable[[int], str]) -> Router:
+    router = Router(messages, get_state)
+    for paths in BUTTONS:
+        router.button(*paths)(_handler)
+    for state, content_types in STATES:
+        router.state(state, content_types)(_handler)
+    return router
+
+
+def _message(text: str) -> types.Message:
+    return types.Message.de_json(json.dumps({
+        "message_id": 1, "date": 0, "text": text,
+        "chat": {"id": 1, "type": "private"},
+        "from": {"id": 1, "is_bot": False, "first_name": "x"},
+    }))
+
+
+def main():
+    updates = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    states = {1: None}
+    chain = build_filter_chain(states.get)
+    router = build_router(states.get)
+    cases = {
+        'first button': _message(messages.get(BUTTONS[0][0])),
+        'last button': _message(messages.get(BUTTONS[-1][0])),
+        'free text': _message("просто текст поста"),
+    }
+
+    print(f"{updates} updates each, ns/update (filter chain -> router)")
+    for name, message in cases.items():
+        timings = []
+        for resolve in (lambda: resolve_chain(chain, message), lambda: router.resolve(message)):
+            started = time.perf_counter()
+            for _ in range(updates):
+                resolve()
+            timings.append((time.perf_counter() - started) / updates * 1e9)
+        print(f"  {name:<13} {timings[0]:7.0f} -> {timings[1]:5.0f}")
+
+
+if __name__ == "__main__":
+    main()
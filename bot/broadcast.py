@@ -0,0 +1,252 @@
+import datetime
+import queue
+import threading
+import time
+from typing import Optional, Tuple
+import telebot
+from .logger import logger
+from .config import messages
+from .database import Database
+from .errors import get_retry_after, is_transient, is_unreachable
+from .outbound import bulk_priority
+from .ratelimit import TokenBucket
+
+
+class BroadcastJob:
+    """Состояние одной рассылки: счетчики и флаг отмены"""
+
+    def __init__(self, broadcast_id: int, admin_chat_id: int, text: str, total: int = 0):
+        self.id = broadcast_id
+        self.admin_chat_id = admin_chat_id
+        self.text = text
+        self.total = total
+        self.sent = 0
+        self.failed = 0
+        self.cancelled = threading.Event()
+        self.finished = threading.Event()
+        self._lock = threading.Lock()
+
+    def record(self, delivered: bool):
+        with self._lock:
+            if delivered:
+                self.sent += 1
+            else:
+                self.failed += 1
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.failed
+
+
+class BroadcastEngine:
+    """Рассылка всем пользователям с общим лимитом скорости.
+
+    Получателей раздают несколько потоков-отправителей, каждый берет токен
+    из общего TokenBucket (лимит Telegram ~30 сообщений/с на бота).
+    429 ставит на паузу весь bucket на retry_after, сетевые сбои и 5xx
+    повторяются с экспоненциальной задержкой. Одновременно идет только
+    одна рассылка.
+
+    Задание и журнал доставки хранятся в БД (broadcasts / broadcast_deliveries):
+    получатель заносится в журнал до отправки, поэтому после перезапуска
+    resume_unfinished() продолжает рассылку и никому не шлет ее повторно.
+    """
+
+    def __init__(self, bot: telebot.TeleBot, db: Database, rate: float = 25, workers: int = 4,
+                 max_retries: int = 3, progress_interval: float = 15.0):
+        self.bot = bot
+        self.db = db
+        self.limiter = TokenBucket(rate)
+        self.workers = workers
+        self.max_retries = max_retries
+        self.progress_interval = progress_interval
+        self._job: Optional[BroadcastJob] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        job = self._job
+        return job is not None and not job.finished.is_set()
+
+    def start(self, admin_chat_id: int, text: str, active_days: Optional[int] = None) -> Optional[BroadcastJob]:
+        """Запустить рассылку в фоне. None если другая рассылка еще идет.
+        active_days - только пользователям, активным за последние N дней
+        """
+        active_since = None
+        if active_days is not None:
+            active_since = datetime.datetime.now() - datetime.timedelta(days=active_days)
+
+        with self._lock:
+            if self.running:
+                return None
+            broadcast_id, total = self.db.create_broadcast(admin_chat_id, text, active_since)
+            job = BroadcastJob(broadcast_id, admin_chat_id, text, total)
+            self._job = job
+
+        threading.Thread(target=self._run, args=(job,), name="broadcast", daemon=True).start()
+        return job
+
+    def resume_unfinished(self):
+        """Продолжить рассылки, прерванные перезапуском (вызывается при старте бота)"""
+        unfinished = self.db.get_unfinished_broadcasts()
+        if unfinished:
+            threading.Thread(target=self._resume, args=(unfinished,), name="broadcast", daemon=True).start()
+
+    def cancel(self) -> bool:
+        """Остановить текущую рассылку. False если останавливать нечего"""
+        job = self._job
+        if job is None or job.finished.is_set():
+            return False
+        job.cancelled.set()
+        return True
+
+    # === внутреннее ===
+
+    def _resume(self, unfinished: list):
+        for row in unfinished:
+            while True:
+                with self._lock:
+                    current = self._job
+                    if current is None or current.finished.is_set():
+                        counts = self.db.get_broadcast_counts(row['id'])
+                        job = BroadcastJob(row['id'], row['admin_chat_id'], row['text'], row['total'])
+                        # pending - отправка шла в момент остановки, считаем доставленными
+                        job.sent = counts['sent'] + counts['pending']
+                        job.failed = counts['failed']
+                        self._job = job
+                        break
+                current.finished.wait()
+
+            logger.info(f"Broadcast #{job.id} resumed: {job.processed}/{job.total} already processed")
+            try:
+                self.bot.send_message(job.admin_chat_id, messages.get('broadcast.resumed', broadcast_id=job.id))
+            except Exception as e:
+                logger.error(f"Не удалось уведомить о продолжении рассылки: {e}")
+            self._run(job)
+
+    def _run(self, job: BroadcastJob):
+        completed = False
+        try:
+            # получатели читаются страницами по мере отправки
+            users = self.db.iter_broadcast_recipients(job.id)
+            logger.info(f"Broadcast #{job.id} started: {job.total} recipients")
+
+            reporter = threading.Thread(target=self._report_progress, args=(job,),
+                                        name="broadcast-progress", daemon=True)
+            reporter.start()
+
+            recipients: "queue.Queue[Optional[int]]" = queue.Queue(maxsize=self.workers * 4)
+            senders = [
+                threading.Thread(target=self._sender, args=(job, recipients), name=f"broadcast-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for sender in senders:
+                sender.start()
+
+            try:
+                for user_id in users:
+                    if job.cancelled.is_set():
+                        break
+                    recipients.put(user_id)
+            finally:
+                # и при ошибке чтения получателей: отправители дорабатывают очередь
+                # и завершаются до того, как будет выставлен job.finished
+                for _ in senders:
+                    recipients.put(None)
+                for sender in senders:
+                    sender.join()
+
+            self.db.finish_broadcast(job.id, 'cancelled' if job.cancelled.is_set() else 'finished')
+            completed = True
+        except Exception as e:
+            # задание остается running и продолжится после перезапуска
+            logger.error(f"Ошибка рассылки #{job.id}: {e}")
+        finally:
+            job.finished.set()
+
+        if not completed:
+            return
+        logger.info(f"Broadcast #{job.id} finished: sent={job.sent} failed={job.failed} "
+                    f"cancelled={job.cancelled.is_set()}")
+        template = 'broadcast.cancelled' if job.cancelled.is_set() else 'broadcast.finished'
+        try:
+            self.bot.send_message(
+                job.admin_chat_id,
+                messages.get(template, success_count=job.sent, failed_count=job.failed)
+            )
+        except Exception as e:
+            logger.error(f"Не удалось отправить итог рассылки: {e}")
+
+    def _sender(self, job: BroadcastJob, recipients: "queue.Queue[Optional[int]]"):
+        with bulk_priority():
+            self._send_all(job, recipients)
+
+    def _send_all(self, job: BroadcastJob, recipients: "queue.Queue[Optional[int]]"):
+        while True:
+            user_id = recipients.get()
+            if user_id is None:
+                return
+            if job.cancelled.is_set():
+                continue
+            try:
+                if not self.db.claim_broadcast_delivery(job.id, user_id):
+                    continue
+                delivered, error = self._deliver(job, user_id)
+                self.db.finish_broadcast_delivery(job.id, user_id, delivered, error)
+                job.record(delivered)
+            except Exception as e:
+                logger.error(f"Broadcast #{job.id}: ledger error for {user_id}: {e}")
+
+    def _deliver(self, job: BroadcastJob, user_id: int) -> Tuple[bool, Optional[str]]:
+        """(доставлено ли, текст ошибки)"""
+        attempt = 0
+        flood_waits = 0
+        while True:
+            self.limiter.acquire()
+            try:
+                self.bot.send_message(user_id, job.text, parse_mode="HTML", disable_web_page_preview=True)
+                return True, None
+            except Exception as e:
+                retry_after = get_retry_after(e)
+                if retry_after is not None and flood_waits < self.max_retries:
+                    flood_waits += 1
+                    logger.warning(f"Broadcast: 429, pause for {retry_after}s")
+                    self.limiter.pause(retry_after)
+                    continue
+                if is_transient(e) and attempt < self.max_retries:
+                    attempt += 1
+                    time.sleep(2 ** attempt)
+                    continue
+                if is_unreachable(e):
+                    # больше не тратим на него запросы в рассылках и уведомлениях
+                    self.db.mark_user_unreachable(user_id)
+                logger.info(f"Broadcast: not delivered to {user_id}: {e}")
+                return False, str(e)
+
+    def _progress_text(self, job: BroadcastJob) -> str:
+        return messages.get('broadcast.progress',
+                            processed=job.processed,
+                            total=job.total,
+                            success_count=job.sent,
+                            failed_count=job.failed)
+
+    def _report_progress(self, job: BroadcastJob):
+        """Раз в progress_interval обновляет сообщение с прогрессом у админа"""
+        last_text = self._progress_text(job)
+        try:
+            message_id = self.bot.send_message(job.admin_chat_id, last_text).message_id
+        except Exception as e:
+            logger.error(f"Не удалось отправить прогресс рассылки: {e}")
+            return
+
+        while True:
+            stop = job.finished.wait(self.progress_interval)
+            text = self._progress_text(job)
+            if text != last_text:
+                try:
+                    self.bot.edit_message_text(text, job.admin_chat_id, message_id)
+                    last_text = text
+                except Exception as e:
+                    logger.warning(f"Не удалось обновить прогресс рассылки: {e}")
+            if stop:
+                return
@@ -1,5 +1,7 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Dict, Any
+from typing import Dict, Any, FrozenSet, List, Callable
+from string import Formatter
+import operator
 import yaml
 import os
 # относительные импорты 
@@ -16,6 +18,78 @@ class Settings(BaseSettings):
     bot_username: str
     group_username: str 
     admin_ids: list[int]
+
+    # кеш проверки подписки (секунды / количество пользователей)
+    subscription_cache_ttl: int = 600
+    subscription_negative_ttl: int = 30
+    subscription_cache_size: int = 10000
+
+    # рассылка: сообщений в секунду на весь бот и число потоков-отправителей
+    broadcast_rate: float = 25
+    broadcast_workers: int = 4
+
+    # исходящие запросы: сообщений в секунду на бота, в секунду в личный чат, в минуту в группу/канал
+    outbound_global_rate: float = 30
+    outbound_chat_rate: float = 1
+    outbound_group_rate: float = 20
+
+    # HTTP к Bot API: соединений в пуле (0 - по числу потоков бота) и таймауты в секундах
+    http_pool_size: int = 0
+    http_connect_timeout: float = 5
+    http_read_timeout: float = 30
+    # сколько секунд Telegram держит getUpdates без новых апдейтов
+    long_polling_timeout: int = 25
+
+    # прием апдейтов: "polling" (по умолчанию) или "webhook"
+    run_mode: str = "polling"
+    # публичный https адрес, который Telegram будет вызывать (https://example.com/tg)
+    webhook_url: str = ""
+    # если не задан, генерируется при каждом запуске
+    webhook_secret: str = ""
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8080
+    # сколько одновременных соединений Telegram открывает к webhook (max_connections);
+    # хендлеры выполняются в update_workers потоках диспетчера
+    webhook_workers: int = 8
+    webhook_queue_size: int = 1000
+
+    # обработка апдейтов: потоков (апдейты одного пользователя - всегда в одном
+    # потоке по порядку) и длина очереди каждого потока
+    update_workers: int = 8
+    update_queue_size: int = 1000
+    # защита от флуда: не больше flood_rate_limit апдейтов за flood_window секунд
+    # от одного пользователя (админы без ограничений); сверх inbound_max_pending
+    # апдейтов в обработке новые апдейты не-админов отбрасываются
+    # (в среднем не чаще outbound_chat_rate: ответы пользователю не ждут лимита своего чата)
+    flood_rate_limit: int = 10
+    flood_window: float = 10
+    inbound_max_pending: int = 1000
+
+    # куда отправлять заявки: "group" (в group_username) или "direct" (в личку каждому админу)
+    moderation_mode: str = "group"
+    # фоновые действия после решения по заявке: потоки и число попыток
+    moderation_workers: int = 2
+    moderation_max_attempts: int = 8
+    # публикаций в канал в секунду (массовое одобрение из /queue идет не быстрее, 0 - без ограничения)
+    channel_publish_rate: float = 0.3
+    # не чаще одного поста в канал раз в publish_interval секунд
+    publish_interval: float = 0
+    # или по одному посту в каждый слот: ["09:00","13:00","19:00"] (тогда interval не важен)
+    publish_slots: list[str] = []
+    # заявок на одной странице /queue
+    queue_page_size: int = 10
+
+    # хранение черновиков постов: "memory" или "sqlite" (переживает перезапуск)
+    state_backend: str = "memory"
+    # через сколько секунд бездействия черновик считается брошенным
+    draft_ttl: int = 86400
+    # максимум черновиков в памяти (для sqlite - размер кеша перед БД)
+    state_max_users: int = 10000
+
+    # раз в сколько секунд записывать активность пользователей пачкой (0 - сразу)
+    activity_flush_interval: float = 5
+    # сколько id известных пользователей помнить для записи активности пачкой
+    activity_known_users: int = 100000
     
     
     model_config = SettingsConfigDict(
@@ -23,29 +97,152 @@ class Settings(BaseSettings):
         env_file_encoding='utf-8'
     )
 
+# Плейсхолдеры, которые код передает в шаблоны messages.yaml.
+# Шаблон с любым другим {полем} - ошибка при загрузке каталога, а не при отправке
+TEMPLATE_FIELDS: Dict[str, FrozenSet[str]] = {
+    'post_creation.confirmation': frozenset({'post_text', 'media_status', 'contact_info'}),
+    'post_creation.sent_for_review': frozenset({'post_id'}),
+    'admin.new_application': frozenset({'author', 'post_id', 'post_text', 'media_status', 'contact_info'}),
+    'admin.application_approved': frozenset({'author', 'post_id', 'post_text', 'media_status', 'contact_info',
+                                             'admin_username'}),
+    'admin.application_rejected': frozenset({'author', 'post_id', 'post_text', 'media_status', 'contact_info',
+                                             'admin_username'}),
+    'user_notifications.approved': frozenset({'post_id'}),
+    'user_notifications.rejected': frozenset({'post_id'}),
+    'broadcast.starting': frozenset({'message_text'}),
+    'broadcast.progress': frozenset({'processed', 'total', 'success_count', 'failed_count'}),
+    'broadcast.finished': frozenset({'success_count', 'failed_count'}),
+    'broadcast.cancelled': frozenset({'success_count', 'failed_count'}),
+    'broadcast.resumed': frozenset({'broadcast_id'}),
+    'moderation.user_banned_admin': frozenset({'user'}),
+    'moderation.user_unbanned_admin': frozenset({'user'}),
+    'stats.message': frozenset({'total_users', 'total_posts', 'pending_posts', 'approved_posts',
+                                'rejected_posts', 'days'}),
+    'stats.day': frozenset({'date', 'new_users', 'posts_submitted', 'posts_approved', 'posts_rejected'}),
+    'channel_post.template': frozenset({'post_text', 'author_info'}),
+    'queue.header': frozenset({'count'}),
+    'queue.item': frozenset({'post_id', 'author', 'preview'}),
+    'queue.approved': frozenset({'count'}),
+    'queue.rejected': frozenset({'count'}),
+    'publish_queue.header': frozenset({'count', 'next_time'}),
+    'publish_queue.item': frozenset({'position', 'post_id', 'author', 'preview'}),
+    'publish_queue.moved': frozenset({'post_id', 'position'}),
+    'publish_queue.not_found': frozenset({'post_id'}),
+}
+
+
+class Template:
+    """Шаблон сообщения, разобранный один раз при загрузке каталога.
+
+    Простые {поля} компилируются в printf-строку и itemgetter по именам,
+    поэтому format() не разбирает шаблон заново на каждый вызов.
+    """
+    __slots__ = ('text', 'fields', '_printf', '_getter', '_single')
+
+    def __init__(self, path: str, text: str):
+        self.text = text
+        printf_parts = []
+        names = []
+        simple = True
+        for literal, field, spec, conversion in Formatter().parse(text):
+            printf_parts.append(literal.replace('%', '%%'))
+            if field is None:
+                continue
+            if not field.isidentifier():
+                raise ValueError(f"Template '{path}': unsupported placeholder {{{field}}}")
+            if spec or conversion:
+                simple = False
+            printf_parts.append('%s')
+            names.append(field)
+
+        self.fields = frozenset(names)
+        # шаблоны с {поле:формат} / {поле!r} форматируются обычным str.format_map
+        self._printf = ''.join(printf_parts) if simple and names else None
+        self._getter = operator.itemgetter(*names) if self._printf else None
+        self._single = len(names) == 1
+
+    def format(self, kwargs: Dict[str, Any]) -> str:
+        if self._printf is None:
+            return self.text.format_map(kwargs)
+        values = self._getter(kwargs)
+        return self._printf % ((values,) if self._single else values)
+
+
 # из messages.yaml
 class Messages:
+    """Каталог сообщений. YAML при загрузке разворачивается в плоский словарь
+    'раздел.ключ' -> текст, шаблоны с {полями} заранее разбираются в Template
+    """
+
     def __init__(self, yaml_file: str = 'messages.yaml'):
-        config_path = os.path.join(os.path.dirname(__file__), yaml_file)
+        self.yaml_file = yaml_file
+        # растет при каждой загрузке; по нему сбрасываются кеши клавиатур и роутер
+        self.version = 0
+        self._listeners: List[Callable[[], None]] = []
+        self.load()
+
+    def on_reload(self, callback: Callable[[], None]):
+        """Вызывать callback после каждой перезагрузки каталога"""
+        self._listeners.append(callback)
+
+    def load(self):
+        """(Пере)загрузить каталог из файла"""
+        config_path = os.path.join(os.path.dirname(__file__), self.yaml_file)
         with open(config_path, 'r', encoding='utf-8') as f:
-            self.data = yaml.safe_load(f)
-    
+            data = yaml.safe_load(f)
+
+        texts: Dict[str, Any] = {}
+        _flatten(data, '', texts)
+
+        templates: Dict[str, Template] = {}
+        for path, value in texts.items():
+            if not isinstance(value, str):
+                continue
+            template = Template(path, value)
+            allowed = TEMPLATE_FIELDS.get(path, frozenset())
+            unknown = template.fields - allowed
+            if unknown:
+                raise ValueError(
+                    f"Template '{path}' uses placeholders {sorted(unknown)} "
+                    f"that the bot does not provide (allowed: {sorted(allowed)})"
+                )
+            if template.fields:
+                templates[path] = template
+
+        missing = [path for path in TEMPLATE_FIELDS if path not in texts]
+        if missing:
+            raise ValueError(f"Templates missing in messages YAML: {missing}")
+
+        self.data = data
+        self._texts = texts
+        self._templates = templates
+        self.version += 1
+
+        for callback in self._listeners:
+            callback()
+
     def get(self, path: str, **kwargs) -> str:
         """Получить сообщение по пути, например: 'subscription.check_required'"""
-        keys = path.split('.')
-        value = self.data
-
         try:
-            for key in keys:
-                value = value[key]
-        except (KeyError, TypeError):
+            value = self._texts[path]
+        except KeyError:
             raise KeyError(f"Path '{path}' not found in messages YAML.")
 
         # Форматирование с переданными параметрами
         if kwargs:
-            return value.format(**kwargs)
+            template = self._templates.get(path)
+            if template is not None:
+                return template.format(kwargs)
         return value
 
+
+def _flatten(node: Any, prefix: str, out: Dict[str, Any]):
+    if isinstance(node, dict):
+        for key, value in node.items():
+            _flatten(value, f"{prefix}{key}.", out)
+    else:
+        out[prefix[:-1]] = node
+
 try:  
     settings = Settings()
     logger.info("Конфиг настроек был получен удачно!")
@@ -1,17 +1,177 @@
 import sqlite3
+import json
 import datetime
-from typing import Optional, List, Tuple
+import threading
+import time
+import queue
+import atexit
+import os
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, List, Sequence, Tuple, Iterator
 from .logger import logger
+from .cache import TTLCache
+
+
+# прагмы применяются к каждому новому соединению пула
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",        # читатели не блокируют писателя
+    "PRAGMA synchronous = NORMAL",      # в WAL fsync только на checkpoint
+    "PRAGMA cache_size = -16000",       # ~16MB кеша страниц на соединение
+    "PRAGMA mmap_size = 134217728",     # 128MB memory-mapped I/O
+    "PRAGMA temp_store = MEMORY",
+    # busy_timeout не задается: его ставит sqlite3.connect(timeout=...)
+)
+
+
+# поля поста для выборок: username / first_name из снимка автора,
+# у старых постов без снимка - из users
+POST_COLUMNS = '''p.*,
+    CASE WHEN p.author_first_name IS NOT NULL THEN p.author_username
+         ELSE (SELECT username FROM users WHERE telegram_id = p.user_id) END AS username,
+    CASE WHEN p.author_first_name IS NOT NULL THEN p.author_first_name
+         ELSE (SELECT first_name FROM users WHERE telegram_id = p.user_id) END AS first_name'''
+
+# страница сегмента "активные после даты": keyset по (last_activity, id),
+# читается по idx_users_last_activity (см. Database._iter_active_user_ids)
+ACTIVE_USERS_PAGE = '''
+    SELECT id, telegram_id, last_activity FROM users
+    WHERE (last_activity, id) > (?, ?) AND {where}
+    ORDER BY last_activity, id
+    LIMIT ?
+'''
+
+
+class PoolExhaustedError(sqlite3.OperationalError):
+    """Все соединения пула заняты дольше timeout секунд"""
+
+
+class ConnectionPool:
+    """Пул долгоживущих соединений SQLite.
+
+    Соединения открываются лениво (не больше size штук), переиспользуются
+    между потоками telebot и держат свой кеш подготовленных выражений
+    (cached_statements), поэтому повторные запросы не парсятся заново.
+    timeout - и ожидание блокировки БД (busy timeout), и ожидание
+    свободного соединения, если все size заняты (PoolExhaustedError).
+    """
+
+    def __init__(self, db_path: str, size: int = 8, timeout: float = 30.0,
+                 cached_statements: int = 256):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False,  # соединение переходит между потоками через пул
+            cached_statements=self.cached_statements,
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = len(self._all) < self.size
+            if can_open:
+                conn = self._open()
+                self._all.append(conn)
+                return conn
+
+        # все соединения заняты - ждем освободившееся
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolExhaustedError(
+                f"all {self.size} connections to {self.db_path} are busy for {self.timeout}s "
+                f"(too small pool or a connection is not released)"
+            ) from None
+
+    def release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Соединение из пула в транзакции: commit при успехе, rollback при ошибке"""
+        conn = self.acquire()
+        try:
+            with conn:
+                yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Закрыть все соединения, перед этим сбросив WAL в основной файл"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            connections, self._all = self._all, []
+
+        for i, conn in enumerate(connections):
+            try:
+                if i == 0:
+                    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                conn.close()
+            except sqlite3.Error as e:
+                logger.error(f"Ошибка при закрытии соединения с БД: {e}")
 
 
 class Database:
-    def __init__(self, db_path: str = 'bot.db'):
+    def __init__(self, db_path: str = 'bot.db', pool_size: int = 8, acl_refresh_interval: float = 5.0):
         self.db_path = db_path
+        self.pool = ConnectionPool(db_path, size=pool_size)
         self.init_database()
+
+        # Админы и забаненные в памяти процесса (is_admin / is_user_banned без запросов).
+        # Любое изменение увеличивает acl_version.version; другие процессы сверяют
+        # его не чаще раза в acl_refresh_interval секунд и перечитывают множества
+        self.acl_refresh_interval = acl_refresh_interval
+        self._acl_lock = threading.Lock()
+        self._admins: frozenset = frozenset()
+        self._banned: frozenset = frozenset()
+        self._acl_version = -1
+        self._acl_checked_at = 0.0
+        self._reload_acl()
+
+        # write-behind буфер активности (включается start_activity_buffer)
+        self._activity_lock = threading.Lock()
+        self._activity_pending: Dict[int, Tuple[Optional[str], Optional[str], datetime.datetime]] = {}
+        self._activity_known: Optional[TTLCache] = None
+        self._activity_thread: Optional[threading.Thread] = None
+
+    def connection(self):
+        """Контекст с соединением из пула (см. ConnectionPool.connection)"""
+        return self.pool.connection()
+
+    def close(self):
+        if self._activity_pending:
+            try:
+                self.flush_activity()
+            except Exception as e:
+                logger.error(f"Ошибка при записи активности пользователей: {e}")
+        self.pool.close()
     
     def init_database(self):
         """Создание таблиц при первом запуске"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connection() as conn:
             # users table 
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS users (
@@ -65,8 +225,225 @@ class Database:
             
             # indexes 
             conn.execute('CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id)')
-            conn.execute('CREATE INDEX IF NOT EXISTS idx_posts_status ON posts(status)')
+            # очередь модерации: фильтр по статусу и keyset по (created_at, id)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_posts_status_created ON posts(status, created_at, id)')
+            # idx_posts_status - префикс idx_posts_status_created
+            conn.execute('DROP INDEX IF EXISTS idx_posts_status')
             conn.execute('CREATE INDEX IF NOT EXISTS idx_posts_user_id ON posts(user_id)')
+
+            # broadcasts table (задания рассылки)
+            # status: running / finished / cancelled
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS broadcasts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    admin_chat_id INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    status TEXT DEFAULT 'running',
+                    max_user_row_id INTEGER NOT NULL DEFAULT 0,
+                    total INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    finished_at TIMESTAMP
+                )
+            ''')
+
+            # broadcast_deliveries table (журнал доставки по получателям)
+            # status: pending (отправка началась) / sent / failed
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+                    broadcast_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    error TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (broadcast_id, user_id),
+                    FOREIGN KEY (broadcast_id) REFERENCES broadcasts (id)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_broadcasts_status ON broadcasts(status)')
+
+            # MIGRATION №2 TO BROADCASTS TABLE
+            # ADD active_since FIELD (TIMESTAMP, DEFAULT: NULL) - сегмент "активные с даты"
+            add_column_if_not_exists(conn, "broadcasts", "active_since", "TIMESTAMP")
+
+            # MIGRATION №3 TO USERS TABLE
+            # ADD is_unreachable FIELD (BOOLEAN, DEFAULT: FALSE) - заблокировал бота / удален
+            # ADD unreachable_since FIELD (TIMESTAMP, DEFAULT: NULL)
+            add_column_if_not_exists(conn, "users", "is_unreachable", "BOOLEAN DEFAULT FALSE")
+            add_column_if_not_exists(conn, "users", "unreachable_since", "TIMESTAMP")
+
+            # MIGRATION №4 TO POSTS TABLE
+            # ADD author_username / author_first_name FIELDS (TEXT) - автор на момент отправки
+            # ADD moderation_text / channel_text FIELDS (TEXT) - тексты заявки и публикации,
+            # отрендеренные один раз при отправке на модерацию
+            add_column_if_not_exists(conn, "posts", "author_username", "TEXT")
+            add_column_if_not_exists(conn, "posts", "author_first_name", "TEXT")
+            add_column_if_not_exists(conn, "posts", "moderation_text", "TEXT")
+            add_column_if_not_exists(conn, "posts", "channel_text", "TEXT")
+
+            # сегменты рассылки по активности
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_users_last_activity ON users(last_activity)')
+
+            # acl_version table (одна строка; меняется при бане/разбане и изменении админов)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS acl_version (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    version INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            conn.execute('INSERT OR IGNORE INTO acl_version (id, version) VALUES (1, 0)')
+
+            # user_states table (состояние диалога и черновик поста, см. state.SqliteStateStore)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS user_states (
+                    telegram_id INTEGER PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    data TEXT NOT NULL DEFAULT '{}',
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_user_states_updated_at ON user_states(updated_at)')
+
+            # moderation_tasks table (очередь побочных эффектов решений модерации, см. moderation.py)
+            # status: pending / failed (выполненные задачи удаляются)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS moderation_tasks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    post_id INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL DEFAULT '{}',
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (post_id) REFERENCES posts (id)
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_moderation_tasks_pending
+                ON moderation_tasks(post_id, id) WHERE status = 'pending'
+            ''')
+
+            # moderation_messages table (все копии заявки: сообщение в группе или у каждого админа)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS moderation_messages (
+                    post_id INTEGER NOT NULL,
+                    chat_id INTEGER NOT NULL,
+                    message_id INTEGER NOT NULL,
+                    has_media BOOLEAN DEFAULT FALSE,
+                    is_edited BOOLEAN DEFAULT FALSE,
+                    PRIMARY KEY (post_id, chat_id, message_id),
+                    FOREIGN KEY (post_id) REFERENCES posts (id)
+                ) WITHOUT ROWID
+            ''')
+
+            # publish_queue table (одобренные посты, которые ждут публикации в канале, см. publisher.py)
+            # status: queued / published / failed; порядок выхода - position, id
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS publish_queue (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    post_id INTEGER UNIQUE NOT NULL,
+                    position INTEGER NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at TIMESTAMP,
+                    last_error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    published_at TIMESTAMP,
+                    FOREIGN KEY (post_id) REFERENCES posts (id)
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_publish_queue_status ON publish_queue(status, position, id)')
+
+            self._init_stats(conn)
+
+    def _init_stats(self, conn: sqlite3.Connection):
+        """Счетчики для /stats, которые ведут триггеры в той же транзакции,
+        что и изменение users/posts (без COUNT(*) по всей таблице)
+        """
+        stats_exist = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats_counters'"
+        ).fetchone()
+
+        # stats_counters: users, posts, posts_pending / posts_approved / posts_rejected
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS stats_counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        ''')
+        # stats_daily: new_users, posts_submitted, posts_approved, posts_rejected по дням
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS stats_daily (
+                day TEXT NOT NULL,
+                name TEXT NOT NULL,
+                value INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, name)
+            ) WITHOUT ROWID
+        ''')
+
+        if not stats_exist:
+            # первый запуск с этой таблицей - считаем то, что уже есть в БД
+            conn.execute('''
+                INSERT INTO stats_counters (name, value)
+                SELECT 'users', COUNT(*) FROM users
+                UNION ALL SELECT 'posts', COUNT(*) FROM posts
+                UNION ALL SELECT 'posts_' || ifnull(status, 'pending'), COUNT(*) FROM posts GROUP BY 1
+            ''')
+            # дни локальные, как у триггеров: created_at - CURRENT_TIMESTAMP (UTC),
+            # reviewed_at пишется из Python уже в локальном времени
+            conn.execute('''
+                INSERT INTO stats_daily (day, name, value)
+                SELECT date(created_at, 'localtime'), 'new_users', COUNT(*) FROM users
+                WHERE date(created_at, 'localtime') IS NOT NULL GROUP BY 1
+                UNION ALL
+                SELECT date(created_at, 'localtime'), 'posts_submitted', COUNT(*) FROM posts
+                WHERE date(created_at, 'localtime') IS NOT NULL GROUP BY 1
+                UNION ALL
+                SELECT date(reviewed_at), 'posts_' || status, COUNT(*) FROM posts
+                WHERE status IN ('approved', 'rejected') AND date(reviewed_at) IS NOT NULL
+                GROUP BY 1, 2
+            ''')
+            logger.info("Stats counters initialized from existing data")
+
+        def bump(table: str, name: str, delta: int) -> str:
+            if table == 'stats_daily':
+                return f'''
+                    INSERT INTO stats_daily (day, name, value) VALUES (date('now', 'localtime'), {name}, {delta})
+                    ON CONFLICT(day, name) DO UPDATE SET value = value + {delta};'''
+            return f'''
+                INSERT INTO stats_counters (name, value) VALUES ({name}, {delta})
+                ON CONFLICT(name) DO UPDATE SET value = value + {delta};'''
+
+        triggers = {
+            'stats_users_insert': ('AFTER INSERT ON users', [
+                bump('stats_counters', "'users'", 1),
+                bump('stats_daily', "'new_users'", 1),
+            ]),
+            'stats_users_delete': ('AFTER DELETE ON users', [
+                bump('stats_counters', "'users'", -1),
+            ]),
+            'stats_posts_insert': ('AFTER INSERT ON posts', [
+                bump('stats_counters', "'posts'", 1),
+                bump('stats_counters', "'posts_' || ifnull(NEW.status, 'pending')", 1),
+                bump('stats_daily', "'posts_submitted'", 1),
+            ]),
+            'stats_posts_delete': ('AFTER DELETE ON posts', [
+                bump('stats_counters', "'posts'", -1),
+                bump('stats_counters', "'posts_' || ifnull(OLD.status, 'pending')", -1),
+            ]),
+            'stats_posts_status': ('AFTER UPDATE OF status ON posts WHEN OLD.status IS NOT NEW.status', [
+                bump('stats_counters', "'posts_' || ifnull(OLD.status, 'pending')", -1),
+                bump('stats_counters', "'posts_' || ifnull(NEW.status, 'pending')", 1),
+            ]),
+            'stats_posts_reviewed': (
+                "AFTER UPDATE OF status ON posts "
+                "WHEN OLD.status IS NOT NEW.status AND NEW.status IN ('approved', 'rejected')", [
+                bump('stats_daily', "'posts_' || NEW.status", 1),
+            ]),
+        }
+        for name, (event, statements) in triggers.items():
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {''.join(statements)} END")
     
     # === WORK WITH USERS ===
     
@@ -74,34 +451,91 @@ class Database:
         """Функция проверяет наличие пользователя и либо его обновляет либо создает
         Возвращает True если новый, False если просто был обновлен
         """
-        with sqlite3.connect(self.db_path) as conn:
-            # checking if user exists 
-            exists = conn.execute(
-                'SELECT 1 FROM users WHERE telegram_id = ?', 
-                (telegram_id,)
-            ).fetchone()
-            
-            if exists:
-                # if exists, updating only first_name и last_activity
-                conn.execute('''
+        now = datetime.datetime.now()
+        # пользователь уже есть в БД и доступен - с включенным буфером активность
+        # запишется пачкой (недоступных mark_user_unreachable убирает из _activity_known,
+        # чтобы is_unreachable сбросился сразу, а не при следующей записи пачки)
+        if self._activity_known is not None and telegram_id in self._activity_known:
+            with self._activity_lock:
+                self._activity_pending[telegram_id] = (username, first_name, now)
+            return False
+
+        with self.connection() as conn:
+            # одна инструкция вместо SELECT + UPDATE/INSERT; created_at заполняет
+            # DEFAULT CURRENT_TIMESTAMP. Новую строку отличает id: AUTOINCREMENT
+            # обновляет sqlite_sequence в конце инструкции, поэтому RETURNING видит
+            # прежний seq - новый id больше него, id существующей строки нет
+            # пользователь снова пишет боту - значит он снова доступен
+            row = conn.execute('''
+                INSERT INTO users 
+                (telegram_id, username, first_name, last_activity) 
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(telegram_id) DO UPDATE SET
+                    username = excluded.username,
+                    first_name = excluded.first_name,
+                    last_activity = excluded.last_activity,
+                    is_unreachable = FALSE,
+                    unreachable_since = NULL
+                RETURNING id > COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'users'), 0)
+            ''', (telegram_id, username, first_name, now)).fetchone()
+
+        if self._activity_known is not None:
+            self._activity_known.set(telegram_id, True)
+        return bool(row[0])
+
+    # === WRITE-BEHIND ACTIVITY BUFFER ===
+
+    def start_activity_buffer(self, interval: float = 5.0, maxsize: int = 10000):
+        """Копить обновления last_activity/username известных пользователей
+        и записывать их одной транзакцией раз в interval секунд
+        """
+        if self._activity_thread is not None:
+            return
+        # telegram_id пользователей, которые точно есть в users (LRU на maxsize)
+        self._activity_known = TTLCache(maxsize=maxsize, ttl=float('inf'))
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.flush_activity()
+                except Exception as e:
+                    logger.error(f"Ошибка при записи активности пользователей: {e}")
+
+        self._activity_thread = threading.Thread(target=loop, name="activity-flush", daemon=True)
+        self._activity_thread.start()
+
+    def flush_activity(self) -> int:
+        """Записать накопленную активность, вернуть количество пользователей.
+        is_unreachable здесь не трогается: отмеченный недоступным пользователь
+        уходит из _activity_known и при возвращении проходит через add_user сразу
+        """
+        with self._activity_lock:
+            pending, self._activity_pending = self._activity_pending, {}
+        if not pending:
+            return 0
+
+        try:
+            with self.connection() as conn:
+                conn.executemany('''
                     UPDATE users 
                     SET username = ?, first_name = ?, last_activity = ?
                     WHERE telegram_id = ?
-                ''', (username, first_name, datetime.datetime.now(), telegram_id))
-                return False
-            else:
-                # if not exists just creating a new one
-                conn.execute('''
-                    INSERT INTO users 
-                    (telegram_id, username, first_name, last_activity) 
-                    VALUES (?, ?, ?, ?)
-                ''', (telegram_id, username, first_name, datetime.datetime.now()))
-                return True
+                ''', [
+                    (username, first_name, last_activity, telegram_id)
+                    for telegram_id, (username, first_name, last_activity) in pending.items()
+                ])
+        except Exception:
+            # не потерять активность: вернуть в буфер, более свежие записи не трогать
+            with self._activity_lock:
+                for telegram_id, item in pending.items():
+                    self._activity_pending.setdefault(telegram_id, item)
+            raise
+        return len(pending)
         
     def get_user(self, telegram_id: int) -> Optional[dict]:
         """Getting user"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self.connection() as conn:
             cursor = conn.execute(
                 'SELECT * FROM users WHERE telegram_id = ?', 
                 (telegram_id,)
@@ -111,154 +545,634 @@ class Database:
     
     def ban_user(self, telegram_id: int):
         """Ban user"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
+        with self.connection() as conn:
+            cursor = conn.execute(
                 'UPDATE users SET is_banned = TRUE WHERE telegram_id = ?',
                 (telegram_id,)
             )
+            version = self._bump_acl_version(conn) if cursor.rowcount else None
+        if version is not None:
+            self._apply_acl_change(version, '_banned', telegram_id, present=True)
     
     def unban_user(self, telegram_id: int):
         """Unban user"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
+        with self.connection() as conn:
+            cursor = conn.execute(
                 'UPDATE users SET is_banned = FALSE WHERE telegram_id = ?',
                 (telegram_id,)
             )
+            version = self._bump_acl_version(conn) if cursor.rowcount else None
+        if version is not None:
+            self._apply_acl_change(version, '_banned', telegram_id, present=False)
     
     def is_user_banned(self, telegram_id: int) -> bool:
         """Checking if user banned"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
-                'SELECT is_banned FROM users WHERE telegram_id = ?',
+        self._refresh_acl_if_stale()
+        return telegram_id in self._banned
+    
+    def mark_user_unreachable(self, telegram_id: int):
+        """Пользователь заблокировал бота или удалил аккаунт"""
+        with self.connection() as conn:
+            conn.execute('''
+                UPDATE users SET is_unreachable = TRUE, unreachable_since = ?
+                WHERE telegram_id = ? AND is_unreachable = FALSE
+            ''', (datetime.datetime.now(), telegram_id))
+        if self._activity_known is not None:
+            self._activity_known.pop(telegram_id)
+
+    def is_user_unreachable(self, telegram_id: int) -> bool:
+        with self.connection() as conn:
+            result = conn.execute(
+                'SELECT is_unreachable FROM users WHERE telegram_id = ?',
                 (telegram_id,)
-            )
-            result = cursor.fetchone()
+            ).fetchone()
             return bool(result[0]) if result else False
-    
+
     def get_all_users(self) -> List[int]:
         """Getting all users"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
-                'SELECT telegram_id FROM users WHERE is_banned = FALSE'
-            )
-            return [row[0] for row in cursor.fetchall()]
+        return list(self.iter_users())
+
+    def iter_users(self, active_since: datetime.datetime = None, page_size: int = 500) -> Iterator[int]:
+        """Поток telegram_id незабаненных и доступных пользователей, страницами по page_size.
+        active_since - только те, кто был активен после этой даты
+        """
+        where = 'is_banned = FALSE AND is_unreachable = FALSE'
+        if active_since is not None:
+            return self._iter_active_user_ids(where, [], active_since, page_size)
+        return self._iter_user_ids(where, [], page_size)
+
+    def _iter_user_ids(self, where: str, params: list, page_size: int) -> Iterator[int]:
+        """Keyset-пагинация по users.id: память не растет с числом пользователей,
+        соединение из пула занято только на время одной страницы
+        """
+        last_row_id = 0
+        while True:
+            with self.connection() as conn:
+                rows = conn.execute(f'''
+                    SELECT id, telegram_id FROM users
+                    WHERE id > ? AND {where}
+                    ORDER BY id
+                    LIMIT ?
+                ''', (last_row_id, *params, page_size)).fetchall()
+            for row in rows:
+                yield row[1]
+            if len(rows) < page_size:
+                return
+            last_row_id = rows[-1][0]
+
+    def _iter_active_user_ids(self, where: str, params: list, active_since: datetime.datetime,
+                              page_size: int) -> Iterator[int]:
+        """То же для сегмента "активные после active_since": keyset по (last_activity, id),
+        страницы читаются диапазоном idx_users_last_activity (id в индексе - rowid),
+        а не перебором всех users.
+        Пользователь, ставший активным во время обхода, переезжает в конец индекса
+        и может встретиться второй раз (рассылку от повтора защищает журнал)
+        """
+        last_activity, last_row_id = active_since, 0
+        while True:
+            with self.connection() as conn:
+                rows = conn.execute(ACTIVE_USERS_PAGE.format(where=where),
+                                    (last_activity, last_row_id, *params, page_size)).fetchall()
+            for row in rows:
+                yield row[1]
+            if len(rows) < page_size:
+                return
+            last_row_id, last_activity = rows[-1][0], rows[-1][2]
     
     # === WORKING WITH POSTS ===
     
     def create_post(self, user_id: int, text_content: str, has_photo: bool = False, has_video: bool = False, 
-                   photo_file_id: str = None, video_file_id: str = None, is_anonymous: bool = False) -> int:
-        """create new post"""
-        with sqlite3.connect(self.db_path) as conn:
+                   photo_file_id: str = None, video_file_id: str = None, is_anonymous: bool = False,
+                   author_username: str = None, author_first_name: str = None) -> int:
+        """create new post
+        author_username / author_first_name - снимок автора на момент отправки
+        """
+        with self.connection() as conn:
             cursor = conn.execute('''
                 INSERT INTO posts 
-                (user_id, text_content, has_photo, has_video, photo_file_id, video_file_id, is_anonymous) 
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (user_id, text_content, has_photo, has_video, photo_file_id, video_file_id, is_anonymous))
+                (user_id, text_content, has_photo, has_video, photo_file_id, video_file_id, is_anonymous,
+                 author_username, author_first_name) 
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (user_id, text_content, has_photo, has_video, photo_file_id, video_file_id, is_anonymous,
+                  author_username, author_first_name))
             return cursor.lastrowid
     
     def get_post(self, post_id: int) -> Optional[dict]:
-        """get post data"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.execute('''
-                SELECT p.*, u.username, u.first_name 
+        """get post data
+        username / first_name берутся из снимка автора, у старых постов без снимка - из users
+        """
+        with self.connection() as conn:
+            cursor = conn.execute(f'''
+                SELECT {POST_COLUMNS}
                 FROM posts p 
-                LEFT JOIN users u ON p.user_id = u.telegram_id 
                 WHERE p.id = ?
             ''', (post_id,))
             row = cursor.fetchone()
             return dict(row) if row else None
+
+    def set_post_texts(self, post_id: int, moderation_text: str, channel_text: str):
+        """Сохранить тексты заявки и публикации, чтобы не рендерить их повторно"""
+        with self.connection() as conn:
+            conn.execute(
+                'UPDATE posts SET moderation_text = ?, channel_text = ? WHERE id = ?',
+                (moderation_text, channel_text, post_id)
+            )
     
-    def approve_post(self, post_id: int, admin_id: int):
-        """aprove post"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('''
+    def approve_post(self, post_id: int, admin_id: int, tasks: Sequence[Tuple[str, dict]] = ()) -> bool:
+        """aprove post
+        tasks - побочные эффекты (kind, payload), ставятся в moderation_tasks той же транзакцией,
+        туда же пост встает в очередь публикации (publish_queue)
+        Возвращает False, если пост не найден или по нему уже есть решение
+        """
+        with self.connection() as conn:
+            # compare-and-set: из одновременных решений по посту проходит только одно
+            cursor = conn.execute('''
                 UPDATE posts 
-                SET status = 'approved', admin_decision_by = ?, 
-                    reviewed_at = ?, published_at = ?
-                WHERE id = ?
-            ''', (admin_id, datetime.datetime.now(), datetime.datetime.now(), post_id))
+                SET status = 'approved', admin_decision_by = ?, reviewed_at = ?
+                WHERE id = ? AND status = 'pending'
+            ''', (admin_id, datetime.datetime.now(), post_id))
+            if cursor.rowcount != 1:
+                return False
+            self._add_moderation_tasks(conn, post_id, tasks)
+            self._enqueue_publication(conn, post_id)
+            return True
     
-    def reject_post(self, post_id: int, admin_id: int):
-        """reject post"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('''
+    def reject_post(self, post_id: int, admin_id: int, tasks: Sequence[Tuple[str, dict]] = ()) -> bool:
+        """reject post
+        tasks - побочные эффекты (kind, payload), ставятся в moderation_tasks той же транзакцией
+        Возвращает False, если пост не найден или по нему уже есть решение
+        """
+        with self.connection() as conn:
+            cursor = conn.execute('''
                 UPDATE posts 
                 SET status = 'rejected', admin_decision_by = ?, reviewed_at = ?
-                WHERE id = ?
+                WHERE id = ? AND status = 'pending'
             ''', (admin_id, datetime.datetime.now(), post_id))
+            if cursor.rowcount != 1:
+                return False
+            self._add_moderation_tasks(conn, post_id, tasks)
+            return True
     
-    def get_pending_posts(self) -> List[dict]:
-        """get pending posts"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.execute('''
-                SELECT p.*, u.username, u.first_name 
-                FROM posts p 
-                LEFT JOIN users u ON p.user_id = u.telegram_id 
-                WHERE p.status = 'pending'
-                ORDER BY p.created_at ASC
-            ''')
+    def get_pending_posts(self, after_id: Optional[int] = None, limit: int = 10) -> List[dict]:
+        """get pending posts
+        Страница очереди модерации в порядке (created_at, id), начиная после поста after_id
+        (keyset по индексу idx_posts_status_created, без OFFSET)
+        """
+        with self.connection() as conn:
+            if after_id is None:
+                cursor = conn.execute(f'''
+                    SELECT {POST_COLUMNS}
+                    FROM posts p 
+                    WHERE p.status = 'pending'
+                    ORDER BY p.created_at, p.id
+                    LIMIT ?
+                ''', (limit,))
+            else:
+                cursor = conn.execute(f'''
+                    SELECT {POST_COLUMNS}
+                    FROM posts p 
+                    WHERE p.status = 'pending'
+                      AND (p.created_at, p.id) > (SELECT created_at, id FROM posts WHERE id = ?)
+                    ORDER BY p.created_at, p.id
+                    LIMIT ?
+                ''', (after_id, limit))
             return [dict(row) for row in cursor.fetchall()]
+
+    def decide_pending_posts(self, first_id: int, last_id: int, status: str, admin_id: int,
+                             tasks_for: Callable[[int], Sequence[Tuple[str, dict]]]) -> List[int]:
+        """Решение по всем еще не обработанным постам страницы очереди [first_id .. last_id]
+        одной транзакцией. status: approved (посты встают в publish_queue) / rejected.
+        tasks_for(post_id) - побочные эффекты для каждого поста, по которому прошло решение
+        Возвращает id этих постов
+        """
+        now = datetime.datetime.now()
+        with self.connection() as conn:
+            cursor = conn.execute('''
+                UPDATE posts 
+                SET status = ?, admin_decision_by = ?, reviewed_at = ?
+                WHERE status = 'pending'
+                  AND (created_at, id) >= (SELECT created_at, id FROM posts WHERE id = ?)
+                  AND (created_at, id) <= (SELECT created_at, id FROM posts WHERE id = ?)
+                RETURNING id
+            ''', (status, admin_id, now, first_id, last_id))
+            post_ids = sorted(row[0] for row in cursor.fetchall())
+            for post_id in post_ids:
+                self._add_moderation_tasks(conn, post_id, tasks_for(post_id))
+                if status == "approved":
+                    self._enqueue_publication(conn, post_id)
+            return post_ids
     
+    # === MODERATION TASKS ===
+
+    def _add_moderation_tasks(self, conn: sqlite3.Connection, post_id: int, tasks: Sequence[Tuple[str, dict]]):
+        if not tasks:
+            return
+        now = datetime.datetime.now()
+        conn.executemany(
+            'INSERT INTO moderation_tasks (post_id, kind, payload, next_attempt_at) VALUES (?, ?, ?, ?)',
+            [(post_id, kind, json.dumps(payload, ensure_ascii=False), now) for kind, payload in tasks]
+        )
+
+    def get_due_moderation_tasks(self, limit: int = 100) -> List[dict]:
+        """Задачи, которые пора выполнять: по одной (самой ранней) на пост,
+        следующая задача поста не выдается, пока не закончится предыдущая
+        """
+        with self.connection() as conn:
+            cursor = conn.execute('''
+                SELECT t.* FROM moderation_tasks t
+                WHERE t.status = 'pending' AND t.next_attempt_at <= ?
+                  AND t.id = (
+                      SELECT MIN(id) FROM moderation_tasks
+                      WHERE post_id = t.post_id AND status = 'pending'
+                  )
+                ORDER BY t.id
+                LIMIT ?
+            ''', (datetime.datetime.now(), limit))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def complete_moderation_task(self, task_id: int):
+        """Выполненная задача больше не нужна"""
+        with self.connection() as conn:
+            conn.execute('DELETE FROM moderation_tasks WHERE id = ?', (task_id,))
+
+    def fail_moderation_task(self, task_id: int, error: str):
+        """Задача не выполнена окончательно - остается в таблице для разбора"""
+        with self.connection() as conn:
+            conn.execute('''
+                UPDATE moderation_tasks 
+                SET status = 'failed', attempts = attempts + 1, last_error = ?
+                WHERE id = ?
+            ''', (error, task_id))
+
+    def retry_moderation_task(self, task_id: int, next_attempt_at: datetime.datetime, error: str):
+        with self.connection() as conn:
+            conn.execute('''
+                UPDATE moderation_tasks 
+                SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+                WHERE id = ?
+            ''', (next_attempt_at, error, task_id))
+
+    def add_moderation_messages(self, post_id: int, messages: Sequence[Tuple[int, int, bool]]):
+        """Запомнить отправленные копии заявки: (chat_id, message_id, has_media)"""
+        if not messages:
+            return
+        with self.connection() as conn:
+            conn.executemany('''
+                INSERT OR IGNORE INTO moderation_messages (post_id, chat_id, message_id, has_media)
+                VALUES (?, ?, ?, ?)
+            ''', [(post_id, chat_id, message_id, has_media) for chat_id, message_id, has_media in messages])
+
+    def get_unedited_moderation_messages(self, post_id: int) -> List[dict]:
+        """Копии заявки, которые еще не обновлены после решения"""
+        with self.connection() as conn:
+            cursor = conn.execute(
+                'SELECT * FROM moderation_messages WHERE post_id = ? AND is_edited = FALSE',
+                (post_id,)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+
+    def has_moderation_messages(self, post_id: int) -> bool:
+        with self.connection() as conn:
+            return conn.execute(
+                'SELECT 1 FROM moderation_messages WHERE post_id = ? LIMIT 1',
+                (post_id,)
+            ).fetchone() is not None
+
+    def mark_moderation_message_edited(self, post_id: int, chat_id: int, message_id: int):
+        with self.connection() as conn:
+            conn.execute('''
+                UPDATE moderation_messages SET is_edited = TRUE
+                WHERE post_id = ? AND chat_id = ? AND message_id = ?
+            ''', (post_id, chat_id, message_id))
+
+    # === PUBLISH QUEUE ===
+
+    def _enqueue_publication(self, conn: sqlite3.Connection, post_id: int):
+        conn.execute('''
+            INSERT OR IGNORE INTO publish_queue (post_id, position)
+            SELECT ?, COALESCE(MAX(position), 0) + 1 FROM publish_queue WHERE status = 'queued'
+        ''', (post_id,))
+
+    def enqueue_publication(self, post_id: int):
+        """Поставить одобренный пост в конец очереди публикации"""
+        with self.connection() as conn:
+            self._enqueue_publication(conn, post_id)
+
+    def get_publish_queue(self, limit: int = 50) -> List[dict]:
+        """Очередь публикации по порядку выхода (queue_id, position, queued_at + поля поста)"""
+        with self.connection() as conn:
+            # created_at пишется CURRENT_TIMESTAMP (UTC), остальные времена - локальные
+            cursor = conn.execute(f'''
+                SELECT q.id AS queue_id, q.position, q.attempts, q.next_attempt_at,
+                       datetime(q.created_at, 'localtime') AS queued_at, {POST_COLUMNS}
+                FROM publish_queue q
+                JOIN posts p ON p.id = q.post_id
+                WHERE q.status = 'queued'
+                ORDER BY q.position, q.id
+                LIMIT ?
+            ''', (limit,))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_publish_queue_size(self) -> int:
+        with self.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM publish_queue WHERE status = 'queued'").fetchone()[0]
+
+    def get_last_publication_time(self) -> Optional[datetime.datetime]:
+        """Когда в последний раз что-то было опубликовано в канале"""
+        with self.connection() as conn:
+            row = conn.execute(
+                "SELECT MAX(published_at) FROM publish_queue WHERE status = 'published'"
+            ).fetchone()
+        return datetime.datetime.fromisoformat(row[0]) if row[0] else None
+
+    def finish_publication(self, queue_id: int, post_id: int):
+        """Пост опубликован в канале"""
+        now = datetime.datetime.now()
+        with self.connection() as conn:
+            conn.execute(
+                "UPDATE publish_queue SET status = 'published', published_at = ? WHERE id = ?",
+                (now, queue_id)
+            )
+            conn.execute('UPDATE posts SET published_at = ? WHERE id = ?', (now, post_id))
+
+    def fail_publication(self, queue_id: int, error: str):
+        """Публикация не удалась окончательно - остается в таблице для разбора"""
+        with self.connection() as conn:
+            conn.execute('''
+                UPDATE publish_queue 
+                SET status = 'failed', attempts = attempts + 1, last_error = ?
+                WHERE id = ?
+            ''', (error, queue_id))
+
+    def retry_publication(self, queue_id: int, next_attempt_at: datetime.datetime, error: str):
+        with self.connection() as conn:
+            conn.execute('''
+                UPDATE publish_queue 
+                SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+                WHERE id = ?
+            ''', (next_attempt_at, error, queue_id))
+
+    def move_publication(self, post_id: int, position: int) -> bool:
+        """Переставить пост на место position (с 1) в очереди публикации.
+        False если поста нет в очереди
+        """
+        with self.connection() as conn:
+            post_ids = [row[0] for row in conn.execute(
+                "SELECT post_id FROM publish_queue WHERE status = 'queued' ORDER BY position, id"
+            )]
+            if post_id not in post_ids:
+                return False
+            post_ids.remove(post_id)
+            post_ids.insert(max(0, min(position - 1, len(post_ids))), post_id)
+            conn.executemany(
+                "UPDATE publish_queue SET position = ? WHERE post_id = ?",
+                [(i, queued_post_id) for i, queued_post_id in enumerate(post_ids, start=1)]
+            )
+            return True
+
     # === WORK WITH ADMINS ===
     
     def add_admin(self, telegram_id: int, username: str = None, added_by: int = None):
         """Добавление админа"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('''
+        with self.connection() as conn:
+            cursor = conn.execute('''
                 INSERT OR IGNORE INTO admins (telegram_id, username, added_by) 
                 VALUES (?, ?, ?)
             ''', (telegram_id, username, added_by))
+            version = self._bump_acl_version(conn) if cursor.rowcount else None
+        if version is not None:
+            self._apply_acl_change(version, '_admins', telegram_id, present=True)
     
     def is_admin(self, telegram_id: int) -> bool:
         """Проверка на админа"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
-                'SELECT 1 FROM admins WHERE telegram_id = ?',
-                (telegram_id,)
-            )
-            return cursor.fetchone() is not None
+        self._refresh_acl_if_stale()
+        return telegram_id in self._admins
+
+    def is_admin_cached(self, telegram_id: int) -> bool:
+        """Проверка на админа только по кешу, без запроса к БД (можно звать из event loop).
+        Кеш обновляют is_admin() и refresh_acl()
+        """
+        return telegram_id in self._admins
+
+    def refresh_acl(self):
+        """Перечитать кеш ACL, если другой процесс менял админов / баны"""
+        self._refresh_acl_if_stale()
+
+    def get_all_admins(self) -> List[int]:
+        """telegram_id всех админов"""
+        self._refresh_acl_if_stale()
+        return sorted(self._admins)
     
     def remove_admin(self, telegram_id: int):
         """Удаление админа"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
+        with self.connection() as conn:
+            cursor = conn.execute(
                 'DELETE FROM admins WHERE telegram_id = ?',
                 (telegram_id,)
             )
+            version = self._bump_acl_version(conn) if cursor.rowcount else None
+        if version is not None:
+            self._apply_acl_change(version, '_admins', telegram_id, present=False)
+    
+    # === ACL CACHE (admins / banned) ===
+
+    def _bump_acl_version(self, conn: sqlite3.Connection) -> int:
+        """Внутри транзакции изменения: поднять версию ACL и вернуть новую"""
+        conn.execute('UPDATE acl_version SET version = version + 1 WHERE id = 1')
+        return conn.execute('SELECT version FROM acl_version WHERE id = 1').fetchone()[0]
+
+    def _apply_acl_change(self, version: int, attr: str, telegram_id: int, present: bool):
+        """После коммита: обновить множество в памяти (write-through)"""
+        with self._acl_lock:
+            if version != self._acl_version + 1:
+                # версию между делом поднял другой процесс - при следующей
+                # проверке множества перечитаются целиком
+                self._acl_version = -1
+                self._acl_checked_at = 0.0
+            else:
+                self._acl_version = version
+            current = getattr(self, attr)
+            setattr(self, attr, current | {telegram_id} if present else current - {telegram_id})
+
+    def _refresh_acl_if_stale(self):
+        now = time.monotonic()
+        if now - self._acl_checked_at < self.acl_refresh_interval:
+            return
+        self._acl_checked_at = now
+        with self.connection() as conn:
+            version = conn.execute('SELECT version FROM acl_version WHERE id = 1').fetchone()[0]
+        if version != self._acl_version:
+            self._reload_acl()
+
+    def _reload_acl(self):
+        with self.connection() as conn:
+            version = conn.execute('SELECT version FROM acl_version WHERE id = 1').fetchone()[0]
+            admins = frozenset(row[0] for row in conn.execute('SELECT telegram_id FROM admins'))
+            banned = frozenset(row[0] for row in conn.execute(
+                'SELECT telegram_id FROM users WHERE is_banned = TRUE'
+            ))
+        with self._acl_lock:
+            self._admins, self._banned, self._acl_version = admins, banned, version
+            self._acl_checked_at = time.monotonic()
+        logger.info(f"ACL cache loaded: {len(admins)} admins, {len(banned)} banned (version {version})")
     
+    # === WORK WITH USER STATES ===
+
+    def get_user_state(self, telegram_id: int, updated_after: datetime.datetime) -> Optional[dict]:
+        """Состояние и черновик (data - JSON), если они менялись после updated_after"""
+        with self.connection() as conn:
+            row = conn.execute(
+                'SELECT state, data, updated_at FROM user_states WHERE telegram_id = ? AND updated_at >= ?',
+                (telegram_id, updated_after)
+            ).fetchone()
+            return dict(row) if row else None
+
+    def set_user_state(self, telegram_id: int, state: str, data: str):
+        with self.connection() as conn:
+            conn.execute('''
+                INSERT INTO user_states (telegram_id, state, data, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(telegram_id) DO UPDATE SET
+                    state = excluded.state, data = excluded.data, updated_at = excluded.updated_at
+            ''', (telegram_id, state, data, datetime.datetime.now()))
+
+    def delete_user_state(self, telegram_id: int):
+        with self.connection() as conn:
+            conn.execute('DELETE FROM user_states WHERE telegram_id = ?', (telegram_id,))
+
+    def purge_user_states(self, updated_before: datetime.datetime) -> int:
+        """Удалить черновики, не менявшиеся с updated_before"""
+        with self.connection() as conn:
+            cursor = conn.execute('DELETE FROM user_states WHERE updated_at < ?', (updated_before,))
+            return cursor.rowcount
+
+    # === WORK WITH BROADCASTS ===
+
+    def create_broadcast(self, admin_chat_id: int, text: str,
+                         active_since: datetime.datetime = None) -> Tuple[int, int]:
+        """Создать задание рассылки. Получатели - пользователи, существующие на момент создания
+        (и активные после active_since, если задано).
+        Возвращает (broadcast_id, количество получателей)
+        """
+        with self.connection() as conn:
+            max_user_row_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM users').fetchone()[0]
+            if active_since is None:
+                total = conn.execute(
+                    'SELECT COUNT(*) FROM users WHERE is_banned = FALSE AND is_unreachable = FALSE'
+                ).fetchone()[0]
+            else:
+                total = conn.execute('''
+                    SELECT COUNT(*) FROM users
+                    WHERE is_banned = FALSE AND is_unreachable = FALSE AND last_activity >= ?
+                ''', (active_since,)).fetchone()[0]
+            cursor = conn.execute('''
+                INSERT INTO broadcasts (admin_chat_id, text, max_user_row_id, total, active_since)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (admin_chat_id, text, max_user_row_id, total, active_since))
+            return cursor.lastrowid, total
+
+    def get_unfinished_broadcasts(self) -> List[dict]:
+        """Рассылки, прерванные перезапуском"""
+        with self.connection() as conn:
+            cursor = conn.execute(
+                "SELECT * FROM broadcasts WHERE status = 'running' ORDER BY id"
+            )
+            return [dict(row) for row in cursor.fetchall()]
+
+    def iter_broadcast_recipients(self, broadcast_id: int, page_size: int = 500) -> Iterator[int]:
+        """Поток получателей рассылки, до которых она еще не дошла (нет записи в журнале)"""
+        with self.connection() as conn:
+            broadcast = conn.execute(
+                'SELECT max_user_row_id, active_since FROM broadcasts WHERE id = ?',
+                (broadcast_id,)
+            ).fetchone()
+        if broadcast is None:
+            return iter(())
+
+        where = '''is_banned = FALSE AND is_unreachable = FALSE AND id <= ?
+            AND NOT EXISTS (
+                SELECT 1 FROM broadcast_deliveries d
+                WHERE d.broadcast_id = ? AND d.user_id = users.telegram_id
+            )'''
+        params = [broadcast['max_user_row_id'], broadcast_id]
+        if broadcast['active_since'] is not None:
+            return self._iter_active_user_ids(where, params, broadcast['active_since'], page_size)
+        return self._iter_user_ids(where, params, page_size)
+
+    def claim_broadcast_delivery(self, broadcast_id: int, user_id: int) -> bool:
+        """Отметить начало отправки. False если получатель уже есть в журнале
+        (значит сообщение ему уже отправлялось и повторять нельзя)
+        """
+        with self.connection() as conn:
+            cursor = conn.execute('''
+                INSERT OR IGNORE INTO broadcast_deliveries (broadcast_id, user_id)
+                VALUES (?, ?)
+            ''', (broadcast_id, user_id))
+            return cursor.rowcount == 1
+
+    def finish_broadcast_delivery(self, broadcast_id: int, user_id: int, delivered: bool, error: str = None):
+        with self.connection() as conn:
+            conn.execute('''
+                UPDATE broadcast_deliveries
+                SET status = ?, error = ?, updated_at = ?
+                WHERE broadcast_id = ? AND user_id = ?
+            ''', ('sent' if delivered else 'failed', error, datetime.datetime.now(), broadcast_id, user_id))
+
+    def get_broadcast_counts(self, broadcast_id: int) -> dict:
+        """Сколько отправлено / не отправлено / в неизвестном состоянии (pending)"""
+        with self.connection() as conn:
+            cursor = conn.execute('''
+                SELECT status, COUNT(*) FROM broadcast_deliveries
+                WHERE broadcast_id = ? GROUP BY status
+            ''', (broadcast_id,))
+            counts = {'sent': 0, 'failed': 0, 'pending': 0}
+            counts.update({row[0]: row[1] for row in cursor.fetchall()})
+            return counts
+
+    def finish_broadcast(self, broadcast_id: int, status: str):
+        """status: finished / cancelled"""
+        with self.connection() as conn:
+            conn.execute('''
+                UPDATE broadcasts SET status = ?, finished_at = ?
+                WHERE id = ?
+            ''', (status, datetime.datetime.now(), broadcast_id))
+
     # === STATISTICS ===
     
     def get_stats(self) -> dict:
-        """Получение статистики"""
-        with sqlite3.connect(self.db_path) as conn:
-            # all users count 
-            users_count = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
-            
-            # all posts count
-            total_posts = conn.execute('SELECT COUNT(*) FROM posts').fetchone()[0]
+        """Получение статистики (из счетчиков stats_counters)"""
+        with self.connection() as conn:
+            counters = dict(conn.execute('SELECT name, value FROM stats_counters').fetchall())
             
-            # all aproved posts count
-            approved_posts = conn.execute(
-                'SELECT COUNT(*) FROM posts WHERE status = "approved"'
-            ).fetchone()[0]
-            
-            # pending posts
-            pending_posts = conn.execute(
-                'SELECT COUNT(*) FROM posts WHERE status = "pending"'
-            ).fetchone()[0]
-            
-            return {
-                'users_count': users_count,
-                'total_posts': total_posts,
-                'approved_posts': approved_posts,
-                'pending_posts': pending_posts
-            }
+        return {
+            'users_count': counters.get('users', 0),
+            'total_posts': counters.get('posts', 0),
+            'approved_posts': counters.get('posts_approved', 0),
+            'pending_posts': counters.get('posts_pending', 0),
+            'rejected_posts': counters.get('posts_rejected', 0),
+        }
+
+    def get_daily_stats(self, days: int = 7) -> List[dict]:
+        """Статистика по дням за последние days дней (включая сегодня), от старых к новым"""
+        today = datetime.date.today()
+        dates = [(today - datetime.timedelta(days=i)).isoformat() for i in range(days - 1, -1, -1)]
+        result = {
+            day: {'date': day, 'new_users': 0, 'posts_submitted': 0, 'posts_approved': 0, 'posts_rejected': 0}
+            for day in dates
+        }
+        with self.connection() as conn:
+            rows = conn.execute(
+                'SELECT day, name, value FROM stats_daily WHERE day >= ?',
+                (dates[0],)
+            ).fetchall()
+        for day, name, value in rows:
+            if day in result:
+                result[day][name] = value
+        return list(result.values())
     
     def get_user_posts_count(self, telegram_id: int) -> int:
         """User posts count"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connection() as conn:
             cursor = conn.execute(
                 'SELECT COUNT(*) FROM posts WHERE user_id = ?',
                 (telegram_id,)
@@ -277,4 +1191,6 @@ def add_column_if_not_exists(conn, table, column, col_def):
         logger.info(f"✔️ Column {column} already exists in {table}")
 
 
-db = Database()
\ No newline at end of file
+# путь можно переопределить переменной окружения DB_PATH (в docker - файл в ./data)
+db = Database(os.getenv("DB_PATH", "bot.db"))
+atexit.register(db.close)
\ No newline at end of file
@@ -0,0 +1,174 @@
+import asyncio
+import queue
+import threading
+from typing import List, Optional, Tuple
+import telebot
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+from .logger import logger
+from .config import messages
+from .admission import AdmissionControl, ADMIT, THROTTLED, DROP
+
+
+# События апдейта, у которых есть автор (from_user / user) или хотя бы чат
+_UPDATE_EVENTS = (
+    'message', 'edited_message', 'callback_query', 'inline_query', 'chosen_inline_result',
+    'shipping_query', 'pre_checkout_query', 'poll_answer', 'my_chat_member', 'chat_member',
+    'chat_join_request', 'channel_post', 'edited_channel_post',
+)
+
+
+def update_key(update: types.Update) -> int:
+    """Чей апдейт: id пользователя, иначе чата, иначе сам update_id"""
+    for name in _UPDATE_EVENTS:
+        event = getattr(update, name, None)
+        if event is None:
+            continue
+        user = getattr(event, 'from_user', None) or getattr(event, 'user', None)
+        if user is not None:
+            return user.id
+        chat = getattr(event, 'chat', None)
+        if chat is not None:
+            return chat.id
+    return update.update_id
+
+
+class ShardedDispatcher:
+    """Обработка апдейтов telebot.TeleBot: по порядку для одного пользователя,
+    параллельно для разных.
+
+    install() подменяет bot.process_new_updates: апдейт попадает в очередь
+    потока update_key(update) % workers, и хендлеры одного пользователя
+    (состояние и черновик поста) никогда не выполняются одновременно.
+    Бот создается с threaded=False - хендлеры выполняются прямо в потоках
+    диспетчера. Очереди ограничены queue_size: при перегрузке polling
+    (или поток webhook) ждет, пока место освободится.
+    admission решает до постановки в очередь, допускать ли апдейт
+    (лимит на пользователя, сброс нагрузки), см. AdmissionControl.
+    """
+
+    def __init__(self, bot: telebot.TeleBot, workers: int = 8, queue_size: int = 1000,
+                 admission: Optional[AdmissionControl] = None):
+        self.bot = bot
+        self.workers = workers
+        self.admission = admission
+        self._queues: List["queue.Queue[Tuple[types.Update, int]]"] = [
+            queue.Queue(maxsize=queue_size) for _ in range(workers)
+        ]
+        self._process = bot.process_new_updates
+        self._started = False
+
+    def install(self):
+        self.bot.process_new_updates = self.submit
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        for i, updates in enumerate(self._queues):
+            threading.Thread(target=self._worker, args=(updates,), name=f"updates-{i}", daemon=True).start()
+
+    def submit(self, updates: List[types.Update]):
+        for update in updates:
+            # offset следующего getUpdates, раньше его двигал сам process_new_updates
+            if update.update_id > self.bot.last_update_id:
+                self.bot.last_update_id = update.update_id
+            key = update_key(update)
+            verdict = self.admission.check(key) if self.admission else ADMIT
+            if verdict == DROP:
+                continue
+            self._queues[key % self.workers].put((update, verdict))
+
+    def _worker(self, updates: "queue.Queue[Tuple[types.Update, int]]"):
+        while True:
+            update, verdict = updates.get()
+            try:
+                if verdict == THROTTLED:
+                    self._reply_throttled(update)
+                else:
+                    self._process([update])
+            except Exception as e:
+                logger.error(f"Dispatcher: ошибка при обработке апдейта {update.update_id}: {e}")
+            finally:
+                if self.admission:
+                    self.admission.done()
+
+    def _reply_throttled(self, update: types.Update):
+        """Предупреждение о флуде вместо хендлеров (ответ на кнопку заодно убирает ее "часики")"""
+        if update.callback_query:
+            self.bot.answer_callback_query(update.callback_query.id, messages.get('flood.callback'))
+        elif update.message:
+            self.bot.send_message(update.message.chat.id, messages.get('flood.message'))
+
+
+class AsyncShardedDispatcher:
+    """То же для AsyncTeleBot: апдейты одного пользователя обрабатывает одна
+    задача-воркер по очереди, разных пользователей - workers задач параллельно.
+
+    AsyncTeleBot запускает process_new_updates отдельной задачей на каждую
+    пачку из getUpdates, поэтому submit() раскладывает пачку по очередям без
+    await - пачки не перемешиваются и встают в очереди в порядке получения.
+    Ограничение queue_size действует на сам polling: install() оборачивает
+    bot.get_updates, и следующая пачка не запрашивается, пока какая-нибудь
+    очередь полна. start() вызывается внутри работающего event loop
+    """
+
+    def __init__(self, bot: AsyncTeleBot, workers: int = 8, queue_size: int = 1000,
+                 admission: Optional[AdmissionControl] = None):
+        self.bot = bot
+        self.workers = workers
+        self.queue_size = queue_size
+        self.admission = admission
+        self._queues: Optional[List["asyncio.Queue[Tuple[types.Update, int]]"]] = None
+        self._space: Optional[asyncio.Condition] = None
+        self._process = bot.process_new_updates
+        self._get_updates = bot.get_updates
+        self._tasks: List[asyncio.Task] = []
+
+    def install(self):
+        self.bot.process_new_updates = self.submit
+        self.bot.get_updates = self._get_updates_when_ready
+
+    def start(self):
+        if self._queues is not None:
+            return
+        # очереди без maxsize: размер ограничивает _get_updates_when_ready
+        self._queues = [asyncio.Queue() for _ in range(self.workers)]
+        self._space = asyncio.Condition()
+        self._tasks = [asyncio.create_task(self._worker(updates)) for updates in self._queues]
+
+    async def submit(self, updates: List[types.Update]):
+        # без await: вся пачка встает в очереди раньше, чем начнет раскладываться следующая
+        for update in updates:
+            key = update_key(update)
+            verdict = self.admission.check(key) if self.admission else ADMIT
+            if verdict == DROP:
+                continue
+            self._queues[key % self.workers].put_nowait((update, verdict))
+
+    async def _get_updates_when_ready(self, *args, **kwargs):
+        async with self._space:
+            await self._space.wait_for(lambda: all(updates.qsize() < self.queue_size for updates in self._queues))
+        return await self._get_updates(*args, **kwargs)
+
+    async def _worker(self, updates: "asyncio.Queue[Tuple[types.Update, int]]"):
+        while True:
+            update, verdict = await updates.get()
+            async with self._space:
+                self._space.notify_all()
+            try:
+                if verdict == THROTTLED:
+                    await self._reply_throttled(update)
+                else:
+                    await self._process([update])
+            except Exception as e:
+                logger.error(f"Dispatcher: ошибка при обработке апдейта {update.update_id}: {e}")
+            finally:
+                if self.admission:
+                    self.admission.done()
+
+    async def _reply_throttled(self, update: types.Update):
+        if update.callback_query:
+            await self.bot.answer_callback_query(update.callback_query.id, messages.get('flood.callback'))
+        elif update.message:
+            await self.bot.send_message(update.message.chat.id, messages.get('flood.message'))
@@ -0,0 +1,38 @@
+from typing import Optional
+import requests
+from telebot.apihelper import ApiTelegramException
+
+
+# Разбор ошибок Telegram API: что можно повторить, а что нет
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Секунды из retry_after для 429 Too Many Requests, иначе None"""
+    if not isinstance(error, ApiTelegramException) or error.error_code != 429:
+        return None
+    parameters = (error.result_json or {}).get("parameters") or {}
+    return float(parameters.get("retry_after", 1))
+
+
+def is_transient(error: Exception) -> bool:
+    """Сетевые сбои и 5xx - есть смысл повторить запрос"""
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    if isinstance(error, ApiTelegramException):
+        return error.error_code >= 500
+    return False
+
+
+# 403 в личном чате: пользователь заблокировал бота или удалил аккаунт
+UNREACHABLE_DESCRIPTIONS = (
+    "bot was blocked by the user",
+    "user is deactivated",
+)
+
+
+def is_unreachable(error: Exception) -> bool:
+    """Пользователю больше нельзя писать, повторять бессмысленно"""
+    if not isinstance(error, ApiTelegramException) or error.error_code != 403:
+        return False
+    description = (error.description or "").lower()
+    return any(text in description for text in UNREACHABLE_DESCRIPTIONS)
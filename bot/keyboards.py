@@ -0,0 +1,156 @@
+import threading
+from typing import Callable, Dict
+from telebot import types
+# относительные импорты
+from .config import messages
+from .cache import TTLCache
+
+
+# Клавиатуры собираются и сериализуются в JSON один раз, дальше в
+# reply_markup уходит готовая строка. Кеш сбрасывается при перезагрузке
+# каталога сообщений (messages.on_reload)
+
+
+class CachedMarkup(types.JsonSerializable):
+    """Клавиатура, уже сериализованная в JSON"""
+    __slots__ = ('json',)
+
+    def __init__(self, json: str):
+        self.json = json
+
+    def to_json(self) -> str:
+        return self.json
+
+
+_static: Dict[str, CachedMarkup] = {}
+_subscription = TTLCache(maxsize=128, ttl=float('inf'))
+_lock = threading.Lock()
+
+# в шаблоне клавиатуры модерации вместо номера поста стоит этот маркер
+_POST_ID = "__post_id__"
+# то же для границ страницы /queue
+_FIRST_ID = "__first_id__"
+_LAST_ID = "__last_id__"
+
+
+def clear_cache():
+    with _lock:
+        _static.clear()
+    _subscription.clear()
+
+
+messages.on_reload(clear_cache)
+
+
+def _cached(key: str, build: Callable[[], types.JsonSerializable]) -> CachedMarkup:
+    markup = _static.get(key)
+    if markup is None:
+        with _lock:
+            markup = _static.get(key)
+            if markup is None:
+                markup = CachedMarkup(build().to_json())
+                _static[key] = markup
+    return markup
+
+
+# Клавиатуры
+def get_subscription_keyboard(channel_usernames: list[str]):
+    key = tuple(channel_usernames)
+    markup = _subscription.get(key)
+    if markup is None:
+        markup = CachedMarkup(_build_subscription_keyboard(channel_usernames).to_json())
+        _subscription.set(key, markup)
+    return markup
+
+def _build_subscription_keyboard(channel_usernames: list[str]):
+    markup = types.InlineKeyboardMarkup(row_width=1)
+    for username in channel_usernames:
+        markup.add(types.InlineKeyboardButton(messages.get('buttons.subscribe'), url=f"https://t.me/{username}"))
+    markup.add(types.InlineKeyboardButton(messages.get('buttons.check_subscription'), callback_data="check_subscription"))
+
+    return markup
+
+def get_main_keyboard():
+    return _cached('main', _build_main_keyboard)
+
+def _build_main_keyboard():
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
+    markup.add(types.KeyboardButton(messages.get('buttons.write_post')))
+    markup.add(types.KeyboardButton(messages.get('buttons.support')))
+    return markup
+
+def get_photo_skip_keyboard():
+    return _cached('photo_skip', _build_photo_skip_keyboard)
+
+def _build_photo_skip_keyboard():
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
+    markup.add(types.KeyboardButton(messages.get('buttons.skip_media')))
+    return markup
+
+def get_anonymity_keyboard():
+    return _cached('anonymity', _build_anonymity_keyboard)
+
+def _build_anonymity_keyboard():
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
+    markup.add(types.KeyboardButton(messages.get('buttons.anonymous')))
+    markup.add(types.KeyboardButton(messages.get('buttons.leave_contact')))
+    return markup
+
+def get_confirmation_keyboard():
+    return _cached('confirmation', _build_confirmation_keyboard)
+
+def _build_confirmation_keyboard():
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
+    markup.row(
+        types.KeyboardButton(messages.get('buttons.yes_send')),
+        types.KeyboardButton(messages.get('buttons.no_restart'))
+    )
+    return markup
+
+def get_back_keyboard():
+    return _cached('back', _build_back_keyboard)
+
+def _build_back_keyboard():
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
+    markup.add(types.KeyboardButton(messages.get('buttons.back')))
+    return markup
+
+def get_moderation_keyboard(post_id: int):
+    template = _cached('moderation', lambda: _build_moderation_keyboard(_POST_ID))
+    return CachedMarkup(template.json.replace(_POST_ID, str(int(post_id))))
+
+def _build_moderation_keyboard(post_id):
+    markup = types.InlineKeyboardMarkup()
+    markup.row(
+        types.InlineKeyboardButton(
+            messages.get('buttons.approve'),
+            callback_data=f'approve_{post_id}'
+        ),
+        types.InlineKeyboardButton(
+            messages.get('buttons.reject'),
+            callback_data=f'reject_{post_id}'
+        )
+    )
+    return markup
+
+def get_queue_keyboard(first_id: int, last_id: int, has_more: bool):
+    """Кнопки страницы /queue: решение по всей странице [first_id .. last_id] и следующая страница"""
+    key = 'queue' if has_more else 'queue_last'
+    template = _cached(key, lambda: _build_queue_keyboard(_FIRST_ID, _LAST_ID, has_more))
+    return CachedMarkup(template.json.replace(_FIRST_ID, str(int(first_id))).replace(_LAST_ID, str(int(last_id))))
+
+def _build_queue_keyboard(first_id, last_id, has_more: bool):
+    markup = types.InlineKeyboardMarkup()
+    markup.row(
+        types.InlineKeyboardButton(
+            messages.get('buttons.approve_page'),
+            callback_data=f'queue_approve_{first_id}_{last_id}'
+        ),
+        types.InlineKeyboardButton(
+            messages.get('buttons.reject_page'),
+            callback_data=f'queue_reject_{first_id}_{last_id}'
+        )
+    )
+    if has_more:
+        markup.row(types.InlineKeyboardButton(messages.get('buttons.next_page'), callback_data=f'queue_next_{last_id}'))
+    return markup
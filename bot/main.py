@@ -1,86 +1,166 @@
 from telebot import types
-from typing import Dict, Optional
-import sys, logging, requests, time, threading, telebot
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import secrets, telebot
 # относительные импорты ы
 from .logger import logger
 from .config import settings, messages
-from .database import Database
+from .database import db
+from .cache import TTLCache
+from .broadcast import BroadcastEngine
+from .errors import is_unreachable
+from .webhook import WebhookServer
+from .state import create_state_store
+from .router import Router
+from .outbound import OutboundScheduler
+from .dispatcher import ShardedDispatcher
+from .admission import AdmissionControl
+from .transport import HttpTransport
+from .moderation import ModerationPipeline, decision_tasks
+from .publisher import PublishScheduler
+from .keyboards import (
+    get_subscription_keyboard, get_main_keyboard, get_photo_skip_keyboard, get_anonymity_keyboard,
+    get_confirmation_keyboard, get_back_keyboard, get_moderation_keyboard, get_queue_keyboard,
+)
+from . import render
 
 logger.info("bot started")
 
 # Инициализация
-bot = telebot.TeleBot(settings.bot_token)
-db = Database()
-
-# Временное хранение данных пользователей
-user_states: Dict[int, str] = {}
-user_data: Dict[int, dict] = {}
+# Одна HTTP сессия на все потоки; соединений в пуле столько, сколько потоков
+# может одновременно ждать ответа Telegram: хендлеры (потоки диспетчера),
+# рассылка, пайплайн модерации с правкой копий, отправка заявок,
+# проверка подписки, публикация и getUpdates
+transport = HttpTransport(
+    pool_size=settings.http_pool_size or (
+        settings.update_workers
+        + settings.broadcast_workers + settings.moderation_workers + 8 + 8
+        + max(1, min(16, len(settings.channel_usernames) * 4)) + 2
+    ),
+    connect_timeout=settings.http_connect_timeout,
+    read_timeout=settings.http_read_timeout,
+    long_polling_timeout=settings.long_polling_timeout,
+)
+transport.install()
+# Все исходящие запросы синхронного клиента идут через общий планировщик лимитов
+outbound = OutboundScheduler(
+    global_rate=settings.outbound_global_rate,
+    chat_rate=settings.outbound_chat_rate,
+    group_rate=settings.outbound_group_rate,
+)
+outbound.install()
+# хендлеры выполняются в потоках диспетчера, свой пул telebot не нужен
+bot = telebot.TeleBot(settings.bot_token, threaded=False)
+# флуд одного пользователя и перегрузка отсекаются до хендлеров, админы - без ограничений
+admission = AdmissionControl(
+    exempt=db.is_admin,
+    rate_limit=settings.flood_rate_limit,
+    window=settings.flood_window,
+    max_pending=settings.inbound_max_pending,
+)
+# апдейты одного пользователя - по порядку в одном потоке, разных - параллельно
+dispatcher = ShardedDispatcher(
+    bot,
+    workers=settings.update_workers,
+    queue_size=settings.update_queue_size,
+    admission=admission,
+)
+dispatcher.install()
+broadcast_engine = BroadcastEngine(
+    bot, db,
+    rate=settings.broadcast_rate,
+    workers=settings.broadcast_workers,
+)
+
+# Правка заявок, уведомления авторов и публикация после решения админа
+moderation_pipeline = ModerationPipeline(
+    bot, db,
+    workers=settings.moderation_workers,
+    max_attempts=settings.moderation_max_attempts,
+)
+# Одобренные посты выходят в канал из publish_queue в своем темпе
+publisher = PublishScheduler(
+    bot, db,
+    channel=settings.channel_username_publish,
+    interval=settings.publish_interval,
+    slots=settings.publish_slots,
+    rate=settings.channel_publish_rate,
+    max_attempts=settings.moderation_max_attempts,
+)
+
+# Пул для одновременной отправки заявки всем админам (moderation_mode=direct)
+moderation_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="moderation-send")
+
+# Состояние диалога и черновик поста по user_id
+state_store = create_state_store(
+    settings.state_backend, db,
+    ttl=settings.draft_ttl,
+    maxsize=settings.state_max_users,
+)
+
+# Текстовые кнопки и состояния FSM -> хендлеры (см. dispatch_message)
+router = Router(messages, state_store.get_state)
+messages.on_reload(router.rebuild)
+
+# Кеш проверки подписки: user_id -> кортеж каналов, на которые нужно подписаться
+subscription_cache = TTLCache(
+    maxsize=settings.subscription_cache_size,
+    ttl=settings.subscription_cache_ttl,
+)
+# Пул для параллельных запросов get_chat_member по всем каналам
+subscription_executor = ThreadPoolExecutor(
+    max_workers=max(1, min(16, len(settings.channel_usernames) * 4)),
+    thread_name_prefix="subscriptions",
+)
+
+def is_channel_member(channel: str, user_id: int) -> bool:
+    try:
+        member = bot.get_chat_member(f"@{channel}", user_id)
+        return member.status in ['member', 'administrator', 'creator']
+    except Exception as e:
+        logger.warning(f"Не удалось проверить подписку {user_id} на @{channel}: {e}")
+        return False
 
 # Проверка подписки на канал
-def check_subscriptions(user_id: int) -> list[str]:
-    need_to_subscribe_channels = []
-    for channel in settings.channel_usernames:
-        try:
-            member = bot.get_chat_member(f"@{channel}", user_id)
-            if not member.status in ['member', 'administrator', 'creator']:
-                need_to_subscribe_channels.append(channel)
-        except:
-            need_to_subscribe_channels.append(channel)
-        logger
+def check_subscriptions(user_id: int, fresh: bool = False) -> list[str]:
+    """Возвращает каналы, на которые пользователь не подписан.
+    fresh=True игнорирует кеш (явное нажатие «Проверить»)
+    """
+    if fresh:
+        subscription_cache.pop(user_id)
+    else:
+        cached = subscription_cache.get(user_id)
+        if cached is not None:
+            return list(cached)
+
+    channels = settings.channel_usernames
+    if len(channels) == 1:
+        results = [is_channel_member(channels[0], user_id)]
+    else:
+        results = list(subscription_executor.map(lambda channel: is_channel_member(channel, user_id), channels))
+
+    need_to_subscribe_channels = [channel for channel, ok in zip(channels, results) if not ok]
+    # отрицательный результат живет недолго, чтобы подписавшийся быстро прошел проверку
+    ttl = settings.subscription_negative_ttl if need_to_subscribe_channels else settings.subscription_cache_ttl
+    subscription_cache.set(user_id, tuple(need_to_subscribe_channels), ttl=ttl)
     return need_to_subscribe_channels
-# Клавиатуры
-def get_subscription_keyboard(channel_usernames: list[str]):
-    markup = types.InlineKeyboardMarkup(row_width=1)
-    for username in channel_usernames:
-        markup.add(types.InlineKeyboardButton(messages.get('buttons.subscribe'), url=f"https://t.me/{username}"))
-    markup.add(types.InlineKeyboardButton(messages.get('buttons.check_subscription'), callback_data="check_subscription"))
-    
-    return markup
-
-def get_main_keyboard():
-    markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
-    markup.add(types.KeyboardButton(messages.get('buttons.write_post')))
-    markup.add(types.KeyboardButton(messages.get('buttons.support')))
-    return markup
-
-def get_photo_skip_keyboard():
-    markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
-    markup.add(types.KeyboardButton(messages.get('buttons.skip_media')))
-    return markup
-
-def get_anonymity_keyboard():
-    markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
-    markup.add(types.KeyboardButton(messages.get('buttons.anonymous')))
-    markup.add(types.KeyboardButton(messages.get('buttons.leave_contact')))
-    return markup
-
-def get_confirmation_keyboard():
-    markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
-    markup.row(
-        types.KeyboardButton(messages.get('buttons.yes_send')),
-        types.KeyboardButton(messages.get('buttons.no_restart'))
-    )
-    return markup
-
-def get_back_keyboard():
-    markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
-    markup.add(types.KeyboardButton(messages.get('buttons.back')))
-    return markup
-
-def get_moderation_keyboard(post_id: int):
-    markup = types.InlineKeyboardMarkup()
-    markup.row(
-        types.InlineKeyboardButton(
-            messages.get('buttons.approve'), 
-            callback_data=f'approve_{post_id}'
-        ),
-        types.InlineKeyboardButton(
-            messages.get('buttons.reject'), 
-            callback_data=f'reject_{post_id}'
-        )
-    )
-    return markup
 
+# Уведомления пользователям
+def notify_user(user_id: int, text: str) -> bool:
+    """Отправить уведомление. Заблокировавших бота пропускаем и помечаем в БД"""
+    if db.is_user_unreachable(user_id):
+        return False
+    try:
+        bot.send_message(user_id, text)
+        return True
+    except Exception as e:
+        if is_unreachable(e):
+            db.mark_user_unreachable(user_id)
+            logger.info(f"User {user_id} is unreachable, marked in DB")
+        else:
+            logger.warning(f"Не удалось уведомить пользователя {user_id}: {e}")
+        return False
 
 # ===COMMANDS HANDLERS===
 @bot.message_handler(commands=['start'])
@@ -154,13 +234,7 @@ def ban_handler(message: types.Message):
         logger.info(f"User with id: {target_id} was banned")
         
         # Уведомляем пользователя
-        try:
-            bot.send_message(
-                target_id,
-                messages.get('moderation.user_banned_notification')
-            )
-        except:
-            pass
+        notify_user(target_id, messages.get('moderation.user_banned_notification'))
             
     except (ValueError, IndexError) as e:
         bot.send_message(message.chat.id, "Неверный формат. Используйте: /ban ID")
@@ -189,13 +263,7 @@ def unban_handler(message: types.Message):
         logger.info(f"User with id: {target_id} was UNbanned")
         
         # Уведомляем пользователя
-        try:
-            bot.send_message(
-                target_id,
-                messages.get('moderation.user_unbanned_notification')
-            )
-        except:
-            pass
+        notify_user(target_id, messages.get('moderation.user_unbanned_notification'))
             
     except (ValueError, IndexError):
         bot.send_message(message.chat.id, "Неверный формат. Используйте: /unban ID")
@@ -205,13 +273,45 @@ def stats_handler(message: types.Message):
     if not db.is_admin(message.from_user.id):
         return
     
-    stats = db.get_stats()
-    bot.send_message(
-        message.chat.id,
-        messages.get('stats.message', 
-                    total_users=stats['users_count'], 
-                    total_posts=stats['total_posts'])
+    bot.send_message(message.chat.id, render.stats_text(db.get_stats(), db.get_daily_stats()))
+
+@bot.message_handler(commands=['queue'])
+def queue_handler(message: types.Message):
+    if not db.is_admin(message.from_user.id):
+        return
+    
+    text, markup = queue_page()
+    bot.send_message(message.chat.id, text, reply_markup=markup)
+
+@bot.message_handler(commands=['pubqueue'])
+def publish_queue_handler(message: types.Message):
+    if not db.is_admin(message.from_user.id):
+        return
+    
+    posts = db.get_publish_queue(limit=settings.queue_page_size)
+    text = render.publish_queue_text(
+        posts,
+        db.get_publish_queue_size(),
+        publisher.next_publish_at(posts[0] if posts else None),
     )
+    bot.send_message(message.chat.id, text)
+
+@bot.message_handler(commands=['pubmove'])
+def publish_move_handler(message: types.Message):
+    if not db.is_admin(message.from_user.id):
+        return
+    
+    try:
+        post_id, position = (int(arg) for arg in message.text.split()[1:3])
+    except ValueError:
+        bot.send_message(message.chat.id, messages.get('publish_queue.move_usage'))
+        return
+    
+    if not db.move_publication(post_id, position):
+        bot.send_message(message.chat.id, messages.get('publish_queue.not_found', post_id=post_id))
+        return
+    publisher.wake()
+    bot.send_message(message.chat.id, messages.get('publish_queue.moved', post_id=post_id, position=max(position, 1)))
 
 @bot.message_handler(commands=['rasil'])
 def broadcast_handler(message: types.Message):
@@ -219,48 +319,45 @@ def broadcast_handler(message: types.Message):
         return
     
     try:
-        broadcast_text = ' '.join(message.text.split()[1:])
+        args = message.text.split()[1:]
+        # необязательный сегмент: /rasil active=7 текст - только активным за 7 дней
+        active_days = None
+        if args and args[0].startswith('active='):
+            active_days = int(args.pop(0).split('=', 1)[1])
+        
+        broadcast_text = ' '.join(args)
         if not broadcast_text:
             bot.send_message(message.chat.id, "Введите текст для рассылки")
             return
         
+        if broadcast_engine.running:
+            bot.send_message(message.chat.id, messages.get('broadcast.already_running'))
+            return
+        
         bot.send_message(
             message.chat.id, 
             messages.get('broadcast.starting', message_text=broadcast_text)
         )
         
-        # Запускаем рассылку в отдельном потоке
-        thread = threading.Thread(target=send_broadcast, args=(message.chat.id, broadcast_text))
-        thread.start()
+        # Рассылка идет в фоне, прогресс приходит отдельным сообщением
+        if broadcast_engine.start(message.chat.id, broadcast_text, active_days) is None:
+            bot.send_message(message.chat.id, messages.get('broadcast.already_running'))
         
     except Exception as e:
         bot.send_message(message.chat.id, f"Ошибка: {str(e)}")
 
-def send_broadcast(admin_chat_id: int, text: str):
-    users = db.get_all_users()
-    success_count = 0
-    fail_count = 0
-    
-    for user_id in users:
-        try:
-            bot.send_message(user_id, text, parse_mode="HTML", disable_web_page_preview=True)
-            success_count += 1
-            time.sleep(0.1)  # Задержка для избежания лимитов
-        except:
-            fail_count += 1
+@bot.message_handler(commands=['stoprasil'])
+def stop_broadcast_handler(message: types.Message):
+    if not db.is_admin(message.from_user.id):
+        return
     
-    bot.send_message(
-        admin_chat_id,
-        messages.get('broadcast.finished', 
-                    success_count=success_count, 
-                    failed_count=fail_count)
-    )
-
-
-
+    if broadcast_engine.cancel():
+        bot.send_message(message.chat.id, messages.get('broadcast.stopping'))
+    else:
+        bot.send_message(message.chat.id, messages.get('broadcast.not_running'))
 
 
-@bot.message_handler(func=lambda message: message.text == messages.get('buttons.support'))
+@router.button('buttons.support')
 def support_handler(message: types.Message):
     bot.send_message(
         message.chat.id,
@@ -268,7 +365,7 @@ def support_handler(message: types.Message):
         reply_markup=get_main_keyboard()
     )
 
-@bot.message_handler(func=lambda message: message.text == messages.get('buttons.write_post'))
+@router.button('buttons.write_post')
 def create_post_handler(message: types.Message):
     user_id = message.from_user.id
     
@@ -281,8 +378,7 @@ def create_post_handler(message: types.Message):
         )
         return
     
-    user_states[user_id] = "waiting_for_text"
-    user_data[user_id] = {}
+    state_store.set(user_id, "waiting_for_text")
     
     # Убираем клавиатуру при создании поста
     bot.send_message(
@@ -291,21 +387,19 @@ def create_post_handler(message: types.Message):
         reply_markup=get_back_keyboard()
     )
 
-@bot.message_handler(func=lambda message: message.text == messages.get('buttons.back'))
+@router.button('buttons.back')
 def back(message: types.Message):
     start_handler(message=message)
     return
 
 
-@bot.message_handler(func=lambda message: message.text == messages.get('buttons.skip_media'))
+@router.button('buttons.skip_media')
 def skip_photo_handler(message: types.Message):
     user_id = message.from_user.id
-    if user_states.get(user_id) != "waiting_for_media":
+    if state_store.get_state(user_id) != "waiting_for_media":
         return
     
-    user_data[user_id]["has_photo"] = False
-    user_data[user_id]["photo_file_id"] = None
-    user_states[user_id] = "waiting_for_anonymity"
+    state_store.update(user_id, "waiting_for_anonymity", has_photo=False, photo_file_id=None)
     
     bot.send_message(
         message.chat.id,
@@ -314,10 +408,10 @@ def skip_photo_handler(message: types.Message):
     )
 
 
-@bot.message_handler(func=lambda message: message.text in [messages.get('buttons.anonymous'), messages.get('buttons.leave_contact')])
+@router.button('buttons.anonymous', 'buttons.leave_contact')
 def anonymity_handler(message: types.Message):
     user_id = message.from_user.id
-    if user_states.get(user_id) != "waiting_for_anonymity":
+    if state_store.get_state(user_id) != "waiting_for_anonymity":
         return
     
     username = message.from_user.username
@@ -330,18 +424,18 @@ def anonymity_handler(message: types.Message):
                 reply_markup=get_anonymity_keyboard()
             )
             return
-        user_data[user_id]["is_anonymous"] = False
+        data = state_store.update(user_id, is_anonymous=False)
     else:
-        user_data[user_id]["is_anonymous"] = True
+        data = state_store.update(user_id, is_anonymous=True)
     
     # Показываем превью поста
-    show_post_preview(message.chat.id, user_id)
+    show_post_preview(message.chat.id, user_id, data)
 
 
-@bot.message_handler(func=lambda message: message.text == messages.get('buttons.yes_send'))
+@router.button('buttons.yes_send')
 def confirm_post_handler(message: types.Message):
     user_id = message.from_user.id
-    data = user_data.get(user_id, {})
+    data = state_store.get_data(user_id)
     
     if not data:
         return
@@ -357,7 +451,9 @@ def confirm_post_handler(message: types.Message):
         has_video=has_video,
         photo_file_id=data.get("photo_file_id"),
         video_file_id=data.get("video_file_id"),
-        is_anonymous=data["is_anonymous"]
+        is_anonymous=data["is_anonymous"],
+        author_username=message.from_user.username,
+        author_first_name=message.from_user.first_name,
     )
     
     confirmation_text = messages.get('post_creation.sent_for_review', post_id=post_id)
@@ -372,15 +468,13 @@ def confirm_post_handler(message: types.Message):
     send_to_moderation(post_id)
     
     # Очищаем данные пользователя
-    user_states.pop(user_id, None)
-    user_data.pop(user_id, None)
+    state_store.clear(user_id)
 
 
-@bot.message_handler(func=lambda message: message.text == messages.get('buttons.no_restart'))
+@router.button('buttons.no_restart')
 def restart_post_handler(message: types.Message):
     user_id = message.from_user.id
-    user_states[user_id] = "waiting_for_text"
-    user_data[user_id] = {}
+    state_store.set(user_id, "waiting_for_text")
     
     bot.send_message(
         message.chat.id,
@@ -388,10 +482,10 @@ def restart_post_handler(message: types.Message):
         reply_markup=get_back_keyboard(),
     )
 
-@bot.message_handler(func=lambda message: message.text == messages.get('buttons.check_subscription'))
-def check_subscription_handler(message: types.Message):
+@router.button('buttons.check_subscription')
+def check_subscription_message_handler(message: types.Message):
     user_id = message.from_user.id
-    not_subscribed_channels = check_subscriptions(user_id)
+    not_subscribed_channels = check_subscriptions(user_id, fresh=True)
     if not_subscribed_channels == []:
         bot.send_message(
             message.chat.id,
@@ -411,7 +505,7 @@ def check_subscription_handler(call):
     chat_id = call.message.chat.id
     message = call.message
     
-    not_subscribed_channels = check_subscriptions(user_id)
+    not_subscribed_channels = check_subscriptions(user_id, fresh=True)
     if not_subscribed_channels == []:
         bot.send_message(
             message.chat.id,
@@ -425,6 +519,14 @@ def check_subscription_handler(call):
             reply_markup=get_subscription_keyboard(not_subscribed_channels)
         )    
 
+def answer_decision_lost(call, post_id: int):
+    """Решение не записано: поста нет или его уже обработали"""
+    post = db.get_post(post_id)
+    if not post:
+        bot.answer_callback_query(call.id, "Пост не найден")
+    else:
+        bot.answer_callback_query(call.id, "Заявка уже обработана")
+
 @bot.callback_query_handler(func=lambda call: call.data.startswith('approve_'))
 def approve_handler(call):
     if not db.is_admin(call.from_user.id):
@@ -436,38 +538,15 @@ def approve_handler(call):
     admin_id = call.from_user.id
     admin_username = call.from_user.username or str(admin_id)
     
-    post = db.get_post(post_id)
-    if not post:
-        bot.answer_callback_query(call.id, "Пост не найден")
+    # Обновляем статус поста, только если решения еще нет (двойное нажатие,
+    # два админа); правка заявки и уведомление автора ставятся в очередь той же
+    # транзакцией, пост - в очередь публикации, все выполняется в фоне
+    tasks = decision_tasks(post_id, "approved", admin_username, call.message)
+    if not db.approve_post(post_id, admin_id, tasks=tasks):
+        answer_decision_lost(call, post_id)
         return
-    
-    # Обновляем статус поста
-    db.approve_post(post_id, admin_id)
-    
-    # Редактируем сообщение в группе админов с помощью существующей функции
-    edit_moderation_message(call.message, post, "approved", admin_username)
-    
-    # Убираем кнопки
-    try:
-        bot.edit_message_reply_markup(
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            reply_markup=None
-        )
-    except:
-        pass
-    
-    # Уведомляем пользователя
-    try:
-        bot.send_message(
-            post["user_id"],
-            messages.get('user_notifications.approved', post_id=post_id)
-        )
-    except:
-        pass
-    
-    # Публикуем в канале
-    publish_to_channel(post)
+    moderation_pipeline.wake()
+    publisher.wake()
     
     # Отвечаем на callback
     bot.answer_callback_query(call.id, "Пост одобрен")
@@ -485,84 +564,50 @@ def reject_handler(call):
     admin_id = call.from_user.id
     admin_username = call.from_user.username or str(admin_id)
     
-    post = db.get_post(post_id)
-    if not post:
-        bot.answer_callback_query(call.id, "Пост не найден")
+    # Обновляем статус поста, только если решения еще нет;
+    # правка заявки и уведомление автора - в фоне
+    tasks = decision_tasks(post_id, "rejected", admin_username, call.message)
+    if not db.reject_post(post_id, admin_id, tasks=tasks):
+        answer_decision_lost(call, post_id)
         return
-    
-    # Обновляем статус поста
-    db.reject_post(post_id, admin_id)
-    
-    # Редактируем сообщение в группе админов с помощью существующей функции
-    edit_moderation_message(call.message, post, "rejected", admin_username)
-    
-    # Убираем кнопки
-    try:
-        bot.edit_message_reply_markup(
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            reply_markup=None
-        )
-    except:
-        pass
-    
-    # Уведомляем пользователя
-    try:
-        bot.send_message(
-            post["user_id"],
-            messages.get('user_notifications.rejected', post_id=post_id)
-        )
-    except:
-        pass
+    moderation_pipeline.wake()
     
     # Отвечаем на callback
     bot.answer_callback_query(call.id, "Пост отклонен")
 
-def send_to_moderation_updated(post_id: int):
-    post = db.get_post(post_id)
-    if not post:
+@bot.callback_query_handler(func=lambda call: call.data.startswith('queue_'))
+def queue_callback_handler(call):
+    if not db.is_admin(call.from_user.id):
+        bot.answer_callback_query(call.id, "У вас нет прав администратора")
         return
     
-    username = post["username"] if post["username"] else str(post["user_id"])
-    media_status = messages.get('status.media_yes') if post['has_photo'] else messages.get('status.media_no')
-    contact_info = messages.get('status.contact_anonymous') if post["is_anonymous"] else f"@{username}"
+    # queue_next_<last_id> / queue_approve_<first_id>_<last_id> / queue_reject_<first_id>_<last_id>
+    action, *ids = call.data.split('_')[1:]
+    last_id = int(ids[-1])
     
-    moderation_text = messages.get('admin.new_application',
-                                  author=f"@{username} ({post['user_id']})",
-                                  post_id=post_id,
-                                  post_text=post['text_content'],
-                                  media_status=media_status,
-                                  contact_info=contact_info)
-    
-    # Получаем всех админов и отправляем каждому индивидуально
-    admins = db.get_all_admins()  # Нужно добавить этот метод в Database
+    if action == "next":
+        bot.answer_callback_query(call.id)
+    else:
+        status = "approved" if action == "approve" else "rejected"
+        admin_username = call.from_user.username or str(call.from_user.id)
+        # вся страница одной транзакцией; уже обработанные посты пропускаются,
+        # правки и уведомления идут в фоне, одобренные посты - в очередь публикации
+        decided = db.decide_pending_posts(
+            int(ids[0]), last_id, status, call.from_user.id,
+            tasks_for=lambda post_id: decision_tasks(post_id, status, admin_username),
+        )
+        moderation_pipeline.wake()
+        publisher.wake()
+        bot.answer_callback_query(call.id, messages.get(f'queue.{status}', count=len(decided)))
     
-    for admin_id in admins:
-        try:
-            # Сохраняем post_id для каждого админа
-            user_data[f"moderating_{admin_id}"] = {"post_id": post_id}
-            
-            if post["has_photo"]:
-                bot.send_photo(
-                    admin_id,
-                    post["photo_file_id"],
-                    caption=moderation_text,
-                    reply_markup=get_moderation_keyboard(post_id)
-                )
-            else:
-                bot.send_message(
-                    admin_id,
-                    moderation_text,
-                    reply_markup=get_moderation_keyboard(post_id)
-                )
-        except Exception as e:
-            logger.error(f"Ошибка при отправке админу {admin_id}: {e}")
-
-
+    text, markup = queue_page(after_id=last_id)
+    try:
+        bot.edit_message_text(text, call.message.chat.id, call.message.message_id, reply_markup=markup)
+    except Exception as e:
+        logger.warning(f"Не удалось обновить страницу очереди: {e}")
 
 # ===STATE HANDLERS===
-@bot.message_handler(content_types=['text', 'photo', 'video', 'document', 'audio', 'voice', 'sticker'], 
-                    func=lambda message: user_states.get(message.from_user.id) == "waiting_for_text")
+@router.state('waiting_for_text', content_types=['text', 'photo', 'video', 'document', 'audio', 'voice', 'sticker'])
 def handle_post_text(message: types.Message):
     user_id = message.from_user.id
 
@@ -572,12 +617,10 @@ def handle_post_text(message: types.Message):
         message.chat.id,
         messages.get('post_creation.no_text_warning'),
         )
-        user_states[user_id] = "waiting_for_text"
         return
         
         
-    user_data[user_id]["text"] = message.text
-    user_states[user_id] = "waiting_for_media"
+    state_store.update(user_id, "waiting_for_media", text=message.text)
     
     bot.send_message(
         message.chat.id,
@@ -585,27 +628,20 @@ def handle_post_text(message: types.Message):
         reply_markup=get_photo_skip_keyboard(),
     )
 
-@bot.message_handler(content_types=['photo', 'video'], func=lambda message: user_states.get(message.from_user.id) == "waiting_for_media")
+@router.state('waiting_for_media', content_types=['photo', 'video'])
 def handle_post_media(message: types.Message):
     user_id = message.from_user.id
     
     
     # handling two types of media 
     if message.content_type == "photo":
-        user_data[user_id]["has_photo"] = True
-        user_data[user_id]["photo_file_id"] = message.photo[-1].file_id  
-        
         # reset the other media type
-        user_data[user_id]["has_video"] = False
-    elif message.content_type == "video":
-        user_data[user_id]["has_video"] = True
-        user_data[user_id]["video_file_id"] = message.video.file_id
-        
+        media = dict(has_photo=True, photo_file_id=message.photo[-1].file_id, has_video=False)
+    else:
         # reset the other media type
-        user_data[user_id]["has_photo"] = False
-    
+        media = dict(has_video=True, video_file_id=message.video.file_id, has_photo=False)
     
-    user_states[user_id] = "waiting_for_anonymity"
+    state_store.update(user_id, "waiting_for_anonymity", **media)
     
     
     bot.send_message(
@@ -614,148 +650,175 @@ def handle_post_media(message: types.Message):
         reply_markup=get_anonymity_keyboard()
     )
 
+
+# Все кнопки и состояния FSM обрабатываются одним хендлером после команд
+def dispatch_message(message: types.Message):
+    handler = router.resolve(message)
+    if handler is not None:
+        handler(message)
+
+bot.register_message_handler(dispatch_message, content_types=router.content_types)
+
 # ===HELPERS===
-def show_post_preview(chat_id: int, user_id: int):
-    data = user_data[user_id]
+def show_post_preview(chat_id: int, user_id: int, data: dict):
     username = bot.get_chat(user_id).username if not data["is_anonymous"] else None
     
-    media_status = messages.get('status.media_yes') if data.get('has_photo', False) or data.get("has_video", False) else messages.get('status.media_no')
-    contact_info = messages.get('status.contact_anonymous') if data['is_anonymous'] else f'@{username}'
-    
-    preview_text = messages.get('post_creation.confirmation',
-                               post_text=data['text'],
-                               media_status=media_status,
-                               contact_info=contact_info)
+    text = render.preview_text(data, username)
     
     if data.get('has_photo', False):
         bot.send_photo(
             chat_id,
             data["photo_file_id"],
-            caption=preview_text,
+            caption=text,
             reply_markup=get_confirmation_keyboard()
         )
     elif data.get("has_video", False):
         bot.send_video(
             chat_id,
             data["video_file_id"],
-            caption=preview_text,
+            caption=text,
             reply_markup=get_confirmation_keyboard()
         )
     else:
         bot.send_message(
             chat_id,
-            preview_text,
+            text,
             reply_markup=get_confirmation_keyboard(),
             parse_mode='HTML',
         )
 
+def queue_page(after_id: Optional[int] = None):
+    """Текст и кнопки страницы /queue после поста after_id"""
+    posts = db.get_pending_posts(after_id, limit=settings.queue_page_size + 1)
+    if not posts:
+        return messages.get('queue.empty'), None
+    has_more = len(posts) > settings.queue_page_size
+    posts = posts[:settings.queue_page_size]
+    return render.queue_text(posts), get_queue_keyboard(posts[0]['id'], posts[-1]['id'], has_more)
+
 def send_to_moderation(post_id: int):
     post = db.get_post(post_id)
     if not post:
         return
     
-    username = post["username"] if post["username"] else str(post["user_id"])
-    media_status = messages.get('status.media_yes') if post['has_photo'] or post['has_video'] else messages.get('status.media_no')
-    contact_info = messages.get('status.contact_anonymous') if post["is_anonymous"] else f"@{username}"
+    # тексты рендерятся один раз и сохраняются в посте (правки и публикация берут их оттуда)
+    moderation_text = render.moderation_text(post)
+    db.set_post_texts(post_id, moderation_text, render.channel_text(post))
     
-    moderation_text = messages.get('admin.new_application',
-                                  author=f"@{username} ({post['user_id']})",
-                                  post_id=post_id,
-                                  post_text=post['text_content'],
-                                  media_status=media_status,
-                                  contact_info=contact_info)
+    if settings.moderation_mode == "direct":
+        # каждому админу в личку, одновременно
+        admin_chats = db.get_all_admins()
+    else:
+        # Используем group_username из конфига для отправки админам
+        admin_chats = [f"@{settings.group_username}"]
     
-    # Используем group_username из конфига для отправки админам
-    admin_chat = f"@{settings.group_username}"
+    if len(admin_chats) == 1:
+        sent = [send_application(admin_chats[0], post, moderation_text)]
+    else:
+        sent = list(moderation_executor.map(lambda chat: send_application(chat, post, moderation_text), admin_chats))
     
+    # все копии заявки обновятся после решения (см. ModerationPipeline)
+    db.add_moderation_messages(post_id, [
+        (message.chat.id, message.message_id, bool(post["has_photo"] or post["has_video"]))
+        for message in sent if message is not None
+    ])
+
+def send_application(chat, post: dict, moderation_text: str) -> Optional[types.Message]:
+    """Отправить заявку в один чат. None если не получилось"""
     try:
         if post["has_photo"]:
-            bot.send_photo(
-                admin_chat,
+            return bot.send_photo(
+                chat,
                 post["photo_file_id"],
                 caption=moderation_text,
-                reply_markup=get_moderation_keyboard(post_id)
+                reply_markup=get_moderation_keyboard(post["id"])
             )
         elif post['has_video']:
-            bot.send_video(
-                admin_chat,
+            return bot.send_video(
+                chat,
                 post["video_file_id"],
                 caption=moderation_text,
-                reply_markup=get_moderation_keyboard(post_id)
+                reply_markup=get_moderation_keyboard(post["id"])
             )
         else:
-            bot.send_message(
-                admin_chat,
+            return bot.send_message(
+                chat,
                 moderation_text,
-                reply_markup=get_moderation_keyboard(post_id)
+                reply_markup=get_moderation_keyboard(post["id"])
             )
     except Exception as e:
-        logger.error(f"Ошибка при отправке на модерацию: {e}")
-
-def edit_moderation_message(message: types.Message, post: dict, status: str, admin_username: str):
-    username = post["username"] if post["username"] else str(post["user_id"])
-    media_status = messages.get('status.media_yes') if post['has_photo'] or post['has_video'] else messages.get('status.media_no')
-    contact_info = messages.get('status.contact_anonymous') if post["is_anonymous"] else f"@{username}"
-    
-    if status == "approved":
-        new_text = messages.get('admin.application_approved',
-                               author=f"@{username} ({post['user_id']})",
-                               post_id=post['id'],
-                               post_text=post['text_content'],
-                               media_status=media_status,
-                               contact_info=contact_info,
-                               admin_username=admin_username)
-    else:  # rejected
-        new_text = messages.get('admin.application_rejected',
-                               author=f"@{username} ({post['user_id']})",
-                               post_id=post['id'],
-                               post_text=post['text_content'],
-                               media_status=media_status,
-                               contact_info=contact_info,
-                               admin_username=admin_username)
-    
+        logger.error(f"Ошибка при отправке на модерацию в {chat}: {e}")
+        return None
+
+
+def run_polling():
+    # polling не работает, пока зарегистрирован webhook
+    bot.remove_webhook()
+    # timeout=None: для getUpdates свои connect / read таймауты из transport,
+    # иначе apihelper берет timeout и на установку соединения
+    bot.polling(none_stop=True, timeout=None, long_polling_timeout=settings.long_polling_timeout)
+
+def run_webhook():
+    secret = settings.webhook_secret or secrets.token_urlsafe(32)
+    path = urlparse(settings.webhook_url).path or "/"
+    server = WebhookServer(
+        bot,
+        host=settings.webhook_host,
+        port=settings.webhook_port,
+        path=path,
+        secret=secret,
+        queue_size=settings.webhook_queue_size,
+    )
+    bot.set_webhook(
+        url=settings.webhook_url,
+        secret_token=secret,
+        max_connections=settings.webhook_workers,
+    )
+    logger.info(f"Webhook registered: {settings.webhook_url}")
     try:
-        if message.photo or message.video:
-            bot.edit_message_caption(
-                new_text,
-                message.chat.id,
-                message.message_id
-            )
-        else:
-            bot.edit_message_text(
-                new_text,
-                message.chat.id,
-                message.message_id,
-            )
-    except:
-        bot.send_message
+        server.serve_forever()
+    finally:
+        server.close()
+        bot.remove_webhook()
+        logger.info("Webhook removed")
 
-def publish_to_channel(post: dict):
-    channel_chat_id = f"@{settings.channel_username_publish}"
-    username = post["username"] if not post["is_anonymous"] else None
-    contact_info = f"@{username}" if username else messages.get('status.contact_anonymous')
+def main():
+    for i in settings.admin_ids:
+        db.add_admin(i, added_by="auto_add_in_script")
+        logger.info(f"Admin with ID: {i} was registered(SCRIPT)")
+    
+    # продолжаем рассылки, прерванные перезапуском
+    broadcast_engine.resume_unfinished()
+    
+    # потоки обработки апдейтов
+    dispatcher.start()
+    
+    # решения модерации, не доделанные до перезапуска, выполняются сейчас
+    moderation_pipeline.start()
     
-    publish_text = messages.get('channel_post.template',
-                               post_text=post['text_content'],
-                               author_info=contact_info)
+    # одобренные посты выходят в канал по очереди (интервал / слоты)
+    publisher.start()
+    
+    # счетчики соединений к Bot API (переиспользование / новые handshake) - в лог
+    transport.start_stats_log()
+    
+    # брошенные черновики постов удаляются по расписанию
+    state_store.start_expiry()
+
+    # last_activity известных пользователей пишется пачками
+    if settings.activity_flush_interval > 0:
+        db.start_activity_buffer(settings.activity_flush_interval, settings.activity_known_users)
     
     try:
-        if post["has_photo"]:
-            bot.send_photo(channel_chat_id, post["photo_file_id"], caption=publish_text, parse_mode="HTML")
-        elif post["has_video"]:
-            bot.send_video(channel_chat_id, post["video_file_id"], caption=publish_text, parse_mode="HTML")
+        if settings.run_mode == "webhook":
+            run_webhook()
         else:
-            bot.send_message(channel_chat_id, publish_text, parse_mode="HTML", disable_web_page_preview=True)
+            run_polling()
+    except KeyboardInterrupt:
+        pass
     except Exception as e:
-        logger.error(f"Ошибка при публикации в канал: {e}")
-
-
-for i in settings.admin_ids:
-    db.add_admin(i, added_by="auto_add_in_script")
-    logger.info(f"Admin with ID: {i} was registered(SCRIPT)")
-try:
-    bot.polling(none_stop=True)
-except KeyboardInterrupt:
-    pass
-except Exception as e:
-    logger.error(f"ERROR: {e}")
\ No newline at end of file
+        logger.error(f"ERROR: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import datetime
+import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import telebot
+from telebot import types
+from .logger import logger
+from .config import messages
+from .database import Database
+from .errors import get_retry_after, is_transient, is_unreachable
+from .outbound import bulk_priority
+from . import render
+
+
+def decision_tasks(post_id: int, status: str, admin_username: str,
+                   message: Optional[types.Message] = None) -> List[Tuple[str, dict]]:
+    """Побочные эффекты решения по заявке в порядке выполнения.
+    message - сообщение с заявкой, на кнопку под которым нажал админ
+    (None - решение из /queue)
+    """
+    edit = {'status': status, 'admin_username': admin_username}
+    if message is not None:
+        edit.update(
+            chat_id=message.chat.id,
+            message_id=message.message_id,
+            has_media=bool(message.photo or message.video),
+        )
+    # публикация в канал - через publish_queue (см. publisher.PublishScheduler)
+    return [
+        ('edit_application', edit),
+        ('notify_author', {'status': status}),
+    ]
+
+
+class ModerationPipeline:
+    """Фоновое выполнение побочных эффектов решений модерации.
+
+    Хендлер approve/reject только записывает решение и задачи (moderation_tasks)
+    одной транзакцией и сразу отвечает на callback. Задачи выполняют потоки
+    пайплайна: правка заявки и уведомление автора (публикацию в канале
+    делает publisher.PublishScheduler).
+
+    Правка заявки обновляет все ее копии из moderation_messages параллельно.
+    Задачи одного поста выполняются строго по порядку одним потоком
+    (post_id % workers). 429 и сетевые сбои / 5xx повторяются с задержкой
+    до max_attempts раз, остальные ошибки помечают задачу failed.
+    Очередь в БД, поэтому незавершенные задачи продолжаются после перезапуска.
+    """
+
+    def __init__(self, bot: telebot.TeleBot, db: Database, workers: int = 2,
+                 max_attempts: int = 8, poll_interval: float = 2.0, edit_concurrency: int = 8):
+        self.bot = bot
+        self.db = db
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._handlers: Dict[str, Callable[[dict, dict], None]] = {
+            'edit_application': self._edit_application,
+            'notify_author': self._notify_author,
+            'publish': self._publish,
+        }
+        self._queues: List["queue.Queue[dict]"] = [queue.Queue() for _ in range(workers)]
+        # копии заявки у разных админов правятся одновременно
+        self._edit_executor = ThreadPoolExecutor(max_workers=edit_concurrency, thread_name_prefix="moderation-edit")
+        # посты, задача которых сейчас выполняется
+        self._in_flight: Set[int] = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._started = False
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        for i, tasks in enumerate(self._queues):
+            threading.Thread(target=self._worker, args=(tasks,), name=f"moderation-{i}", daemon=True).start()
+        threading.Thread(target=self._dispatch, name="moderation-dispatch", daemon=True).start()
+
+    def wake(self):
+        """Новые задачи записаны в БД - не ждать poll_interval"""
+        self._wakeup.set()
+
+    # === внутреннее ===
+
+    def _dispatch(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            # чтение очереди под замком: задача, которую поток уже выполнил,
+            # либо еще в _in_flight, либо уже не pending в БД - дважды не выдается
+            with self._lock:
+                try:
+                    due = self.db.get_due_moderation_tasks()
+                except Exception as e:
+                    logger.error(f"Moderation: не удалось прочитать очередь задач: {e}")
+                    continue
+                for task in due:
+                    if task['post_id'] in self._in_flight:
+                        continue
+                    self._in_flight.add(task['post_id'])
+                    self._queues[task['post_id'] % self.workers].put(task)
+
+    def _worker(self, tasks: "queue.Queue[dict]"):
+        with bulk_priority():
+            self._work(tasks)
+
+    def _work(self, tasks: "queue.Queue[dict]"):
+        while True:
+            task = tasks.get()
+            try:
+                self._execute(task)
+            except Exception as e:
+                logger.error(f"Moderation: ошибка журнала задач #{task['id']}: {e}")
+            finally:
+                with self._lock:
+                    self._in_flight.discard(task['post_id'])
+                # следующая задача этого поста уже может выполняться
+                self._wakeup.set()
+
+    def _execute(self, task: dict):
+        post = self.db.get_post(task['post_id'])
+        if post is None:
+            self.db.fail_moderation_task(task['id'], "post not found")
+            return
+        try:
+            self._handlers[task['kind']](post, json.loads(task['payload']))
+        except Exception as e:
+            attempts = task['attempts'] + 1
+            retry_after = get_retry_after(e)
+            if (retry_after is not None or is_transient(e)) and attempts < self.max_attempts:
+                delay = retry_after if retry_after is not None else min(2 ** attempts, 300)
+                next_attempt_at = datetime.datetime.now() + datetime.timedelta(seconds=delay)
+                self.db.retry_moderation_task(task['id'], next_attempt_at, str(e))
+                logger.warning(f"Moderation: {task['kind']} for post #{post['id']} failed "
+                               f"(attempt {attempts}), retry in {delay}s: {e}")
+                return
+            self.db.fail_moderation_task(task['id'], str(e))
+            logger.error(f"Moderation: {task['kind']} for post #{post['id']} failed: {e}")
+            return
+        self.db.complete_moderation_task(task['id'])
+
+    def _edit_application(self, post: dict, payload: dict):
+        """Обновить все копии заявки (группа или личка каждого админа) параллельно"""
+        text = render.moderation_text(post, payload['status'], payload['admin_username'])
+        copies = self.db.get_unedited_moderation_messages(post['id'])
+        if not copies:
+            if 'chat_id' in payload and not self.db.has_moderation_messages(post['id']):
+                # заявка отправлена до появления moderation_messages - правим то, где нажали
+                self._edit_copy(text, payload['chat_id'], payload['message_id'], payload['has_media'])
+            return
+
+        futures = [
+            self._edit_executor.submit(self._edit_copy, text, copy['chat_id'], copy['message_id'], copy['has_media'])
+            for copy in copies
+        ]
+        retry_error = None
+        for copy, future in zip(copies, futures):
+            try:
+                future.result()
+            except Exception as e:
+                if get_retry_after(e) is not None or is_transient(e):
+                    # при повторе задачи правятся только оставшиеся копии
+                    retry_error = retry_error or e
+                    continue
+                # удаленное сообщение, админ заблокировал бота и т.п. - не повторяем
+                logger.warning(f"Не удалось изменить заявку #{post['id']} в чате {copy['chat_id']}: {e}")
+            self.db.mark_moderation_message_edited(post['id'], copy['chat_id'], copy['message_id'])
+        if retry_error is not None:
+            raise retry_error
+
+    def _edit_copy(self, text: str, chat_id: int, message_id: int, has_media: bool):
+        # без reply_markup Telegram убирает и кнопки approve/reject
+        with bulk_priority():
+            if has_media:
+                self.bot.edit_message_caption(text, chat_id, message_id)
+            else:
+                self.bot.edit_message_text(text, chat_id, message_id)
+
+    def _notify_author(self, post: dict, payload: dict):
+        user_id = post['user_id']
+        if self.db.is_user_unreachable(user_id):
+            return
+        template = ('user_notifications.approved' if payload['status'] == "approved"
+                    else 'user_notifications.rejected')
+        try:
+            self.bot.send_message(user_id, messages.get(template, post_id=post['id']))
+        except Exception as e:
+            if not is_unreachable(e):
+                raise
+            self.db.mark_user_unreachable(user_id)
+            logger.info(f"User {user_id} is unreachable, marked in DB")
+
+    def _publish(self, post: dict, payload: dict):
+        # задачи publish, поставленные до появления publish_queue
+        self.db.enqueue_publication(post['id'])
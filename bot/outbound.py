@@ -0,0 +1,161 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Union
+from telebot import apihelper
+from .logger import logger
+from .cache import TTLCache
+from .ratelimit import TokenBucket
+
+
+# Методы, которые пишут в чат и попадают под лимиты Telegram
+SEND_METHODS = frozenset({
+    'sendMessage', 'sendPhoto', 'sendVideo', 'sendDocument', 'sendAudio', 'sendVoice',
+    'sendAnimation', 'sendSticker', 'sendMediaGroup', 'copyMessage', 'forwardMessage',
+    'editMessageText', 'editMessageCaption', 'editMessageReplyMarkup', 'editMessageMedia',
+})
+
+INTERACTIVE = 0
+BULK = 1
+
+_priority = threading.local()
+
+
+@contextmanager
+def bulk_priority():
+    """Запросы из этого потока - фоновые (рассылка, очередь модерации) и
+    пропускают вперед ответы пользователям
+    """
+    previous = getattr(_priority, 'value', INTERACTIVE)
+    _priority.value = BULK
+    try:
+        yield
+    finally:
+        _priority.value = previous
+
+
+class OutboundScheduler:
+    """Единая точка исходящих запросов синхронного клиента (apihelper.CUSTOM_REQUEST_SENDER).
+
+    Фоновая отправка (bulk_priority) ждет токен из общего bucket (global_rate
+    в секунду на бота) и из bucket своего чата: личные чаты chat_rate в секунду,
+    группы и каналы (chat_id < 0 или @username) group_rate в минуту. Пока ждут
+    ответы пользователям, фоновые запросы общих токенов не получают.
+    429 ставит на паузу bucket чата на retry_after и запрос повторяется,
+    до max_flood_retries раз и если ждать не дольше max_flood_wait секунд.
+
+    Ответы пользователям выполняются в потоке диспетчера, который обслуживает
+    и других пользователей, поэтому ждут не дольше max_interactive_wait:
+    токен чата только списывается (темп одного чата держит защита от флуда,
+    см. AdmissionControl), общий токен ждется не дольше max_interactive_wait,
+    а 429 повторяется после паузы retry_after, только если она не больше
+    max_interactive_wait.
+    Остальные методы (getUpdates, answerCallbackQuery, ...) идут без ограничений.
+    """
+
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1, group_rate: float = 20,
+                 chat_burst: float = 3, max_flood_wait: float = 60, max_flood_retries: int = 3,
+                 max_interactive_wait: float = 1, max_chats: int = 10000):
+        self.global_bucket = TokenBucket(global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate / 60
+        self.max_flood_wait = max_flood_wait
+        self.max_flood_retries = max_flood_retries
+        self.max_interactive_wait = max_interactive_wait
+        # bucket чата забывается, если в чат долго не писали
+        self._chats = TTLCache(maxsize=max_chats, ttl=600)
+        self._chats_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._interactive_waiting = 0
+
+    def install(self):
+        """Пропускать через планировщик все запросы telebot.TeleBot"""
+        apihelper.CUSTOM_REQUEST_SENDER = self.request
+
+    def request(self, method, url, params=None, files=None, timeout=None, proxies=None):
+        method_name = url.rsplit('/', 1)[-1]
+        chat_id = (params or {}).get('chat_id')
+        throttled = method_name in SEND_METHODS and chat_id is not None
+        interactive = getattr(_priority, 'value', INTERACTIVE) == INTERACTIVE
+        max_wait = self.max_interactive_wait if interactive else self.max_flood_wait
+
+        flood_waits = 0
+        while True:
+            if throttled:
+                self.acquire(chat_id)
+            result = apihelper._get_req_session().request(
+                method, url, params=params, files=files, timeout=timeout, proxies=proxies)
+            # загруженные файлы уже прочитаны - такой запрос не повторить
+            if result.status_code != 429 or not throttled or files:
+                return result
+
+            retry_after = self._retry_after(result)
+            if flood_waits >= self.max_flood_retries or retry_after > max_wait:
+                # вызывающий получит ApiTelegramException 429
+                return result
+            flood_waits += 1
+            logger.warning(f"Outbound: 429 for {method_name} in {chat_id}, pause for {retry_after}s")
+            self._chat_bucket(chat_id).pause(retry_after)
+            if interactive:
+                # acquire() не ждет токен чата - паузу выдерживаем здесь
+                # (retry_after не больше max_interactive_wait)
+                time.sleep(retry_after)
+
+    def acquire(self, chat_id: Union[int, str]):
+        """Дождаться токенов чата и общего лимита (ответ пользователю - не дольше max_interactive_wait)"""
+        if getattr(_priority, 'value', INTERACTIVE) == INTERACTIVE:
+            # токен чата списывается без ожидания, чтобы фоновая отправка
+            # в этот же чат учитывала ответы пользователю
+            self._chat_bucket(chat_id).try_acquire()
+            with self._cond:
+                self._interactive_waiting += 1
+            try:
+                if not self.global_bucket.acquire(timeout=self.max_interactive_wait):
+                    # ответ пользователю не теряем: отправляем сверх общего лимита,
+                    # возможный 429 обработает request()
+                    logger.debug(f"Outbound: global limit exceeded, interactive send to {chat_id} goes anyway")
+            finally:
+                with self._cond:
+                    self._interactive_waiting -= 1
+                    self._cond.notify_all()
+            return
+
+        self._chat_bucket(chat_id).acquire()
+
+        retry_delay = 1 / self.global_bucket.rate
+        while True:
+            with self._cond:
+                while self._interactive_waiting:
+                    self._cond.wait()
+                if self.global_bucket.try_acquire():
+                    return
+            time.sleep(retry_delay)
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            with self._chats_lock:
+                bucket = self._chats.get(chat_id)
+                if bucket is None:
+                    if self._is_group(chat_id):
+                        bucket = TokenBucket(self.group_rate)
+                    else:
+                        # в личке допускаем короткую серию (ответ из пары сообщений)
+                        bucket = TokenBucket(self.chat_rate, capacity=self.chat_burst)
+                    self._chats.set(chat_id, bucket)
+        return bucket
+
+    @staticmethod
+    def _is_group(chat_id: Union[int, str]) -> bool:
+        if isinstance(chat_id, str):
+            return chat_id.startswith('@') or chat_id.startswith('-')
+        return chat_id < 0
+
+    @staticmethod
+    def _retry_after(result) -> float:
+        try:
+            parameters = result.json().get('parameters') or {}
+            return float(parameters.get('retry_after', 1))
+        except ValueError:
+            return 1.0
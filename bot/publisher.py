@@ -0,0 +1,130 @@
+import datetime
+import threading
+from typing import List, Optional
+import telebot
+from .logger import logger
+from .database import Database
+from .errors import get_retry_after, is_transient
+from .outbound import bulk_priority
+from . import render
+
+
+def parse_slots(slots: List[str]) -> List[datetime.time]:
+    """["09:00", "18:30"] -> отсортированные datetime.time"""
+    return sorted(datetime.datetime.strptime(slot.strip(), "%H:%M").time() for slot in slots)
+
+
+class PublishScheduler:
+    """Публикация одобренных постов в канал из очереди publish_queue.
+
+    Одобрение только ставит пост в очередь, публикует этот поток:
+    - без slots - по одному посту не чаще раза в interval секунд
+      (и не быстрее rate публикаций в секунду, rate=0 - без ограничения);
+    - со slots (["09:00", "18:00"]) - по одному посту в каждый слот. Слот
+      засчитывается посту, только если наступил после его постановки в очередь
+      и после последней публикации.
+    Момент последней публикации берется из БД, поэтому после перезапуска
+    темп сохраняется, а пропущенный слот публикуется сразу.
+    429 и сетевые сбои / 5xx повторяются до max_attempts раз.
+    """
+
+    def __init__(self, bot: telebot.TeleBot, db: Database, channel: str, interval: float = 0,
+                 slots: Optional[List[str]] = None, rate: float = 0.3, max_attempts: int = 8):
+        self.bot = bot
+        self.db = db
+        self.channel = channel
+        self.interval = max(interval, 1 / rate) if rate > 0 else interval
+        self.slots = parse_slots(slots or [])
+        self.max_attempts = max_attempts
+        self._last_published_at: Optional[datetime.datetime] = None
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._last_published_at = self.db.get_last_publication_time()
+        self._thread = threading.Thread(target=self._loop, name="publisher", daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        """В очереди появился пост (или порядок изменился)"""
+        self._wakeup.set()
+
+    def next_publish_at(self, post: Optional[dict] = None) -> datetime.datetime:
+        """Когда можно опубликовать следующий пост (post - первый в очереди,
+        строка get_publish_queue)"""
+        now = datetime.datetime.now()
+        last = self._last_published_at
+        if not self.slots:
+            if last is None:
+                return now
+            return max(now, last + datetime.timedelta(seconds=self.interval))
+
+        # ближайший слот после последней публикации и постановки поста в очередь
+        # (пропущенный - сразу, но только если пост уже стоял в очереди)
+        queued_at = datetime.datetime.fromisoformat(post['queued_at']) if post else now
+        after = max(last, queued_at) if last else queued_at
+        day = after.date()
+        while True:
+            for slot in self.slots:
+                at = datetime.datetime.combine(day, slot)
+                if at > after:
+                    return max(now, at)
+            day += datetime.timedelta(days=1)
+
+    # === внутреннее ===
+
+    def _loop(self):
+        with bulk_priority():
+            while True:
+                try:
+                    delay = self._publish_due()
+                except Exception as e:
+                    logger.error(f"Publisher: ошибка очереди публикации: {e}")
+                    delay = 60
+                self._wakeup.wait(min(delay, 60))
+                self._wakeup.clear()
+
+    def _publish_due(self) -> float:
+        """Опубликовать пост, если пора. Возвращает, сколько секунд ждать до следующей проверки"""
+        queue = self.db.get_publish_queue(limit=1)
+        if not queue:
+            return 60
+        post = queue[0]
+        wait = (self.next_publish_at(post) - datetime.datetime.now()).total_seconds()
+        if wait > 0:
+            return wait
+
+        now = datetime.datetime.now()
+        if post['next_attempt_at'] and datetime.datetime.fromisoformat(post['next_attempt_at']) > now:
+            return (datetime.datetime.fromisoformat(post['next_attempt_at']) - now).total_seconds()
+
+        try:
+            self._publish(post)
+        except Exception as e:
+            attempts = post['attempts'] + 1
+            retry_after = get_retry_after(e)
+            if (retry_after is not None or is_transient(e)) and attempts < self.max_attempts:
+                delay = retry_after if retry_after is not None else min(2 ** attempts, 300)
+                self.db.retry_publication(post['queue_id'], now + datetime.timedelta(seconds=delay), str(e))
+                logger.warning(f"Publisher: post #{post['id']} failed (attempt {attempts}), retry in {delay}s: {e}")
+                return delay
+            self.db.fail_publication(post['queue_id'], str(e))
+            logger.error(f"Ошибка при публикации в канал поста #{post['id']}: {e}")
+            return 0
+
+        self.db.finish_publication(post['queue_id'], post['id'])
+        self._last_published_at = datetime.datetime.now()
+        logger.info(f"Post #{post['id']} published")
+        return 0
+
+    def _publish(self, post: dict):
+        channel_chat_id = f"@{self.channel}"
+        publish_text = render.channel_text(post)
+        if post["has_photo"]:
+            self.bot.send_photo(channel_chat_id, post["photo_file_id"], caption=publish_text, parse_mode="HTML")
+        elif post["has_video"]:
+            self.bot.send_video(channel_chat_id, post["video_file_id"], caption=publish_text, parse_mode="HTML")
+        else:
+            self.bot.send_message(channel_chat_id, publish_text, parse_mode="HTML", disable_web_page_preview=True)
@@ -0,0 +1,102 @@
+import threading
+import time
+from typing import Hashable, Optional
+from .cache import TTLCache
+
+
+class TokenBucket:
+    """Потокобезопасный token bucket.
+
+    rate - сколько токенов восстанавливается в секунду,
+    capacity - максимальный запас (допустимый всплеск).
+    pause() временно останавливает выдачу токенов всем потокам
+    (например после 429 с retry_after от Telegram).
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated_at
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated_at = now
+
+    def _wait_time(self, tokens: float, now: float) -> float:
+        """0 если токены списаны, иначе сколько подождать до следующей попытки"""
+        if now < self._paused_until:
+            return self._paused_until - now
+        self._refill(now)
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        with self._lock:
+            return self._wait_time(tokens, time.monotonic()) == 0.0
+
+    def acquire(self, tokens: float = 1, timeout: Optional[float] = None) -> bool:
+        """Блокирует поток, пока не получит токены. False если вышел timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._wait_time(tokens, now)
+            if wait == 0.0:
+                return True
+            if deadline is not None:
+                if now + wait > deadline:
+                    return False
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Не выдавать токены следующие seconds секунд"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            # после паузы запас копится заново, без мгновенного всплеска
+            self._tokens = 0.0
+            self._updated_at = self._paused_until
+
+
+class SlidingWindowLimiter:
+    """Не больше limit событий за последние window секунд на ключ (user_id).
+
+    Скользящее окно считается приближенно по двум счетчикам: текущего
+    интервала длиной window и предыдущего (с весом той его части, что еще
+    попадает в окно). На ключ хранится одна короткая запись, ключи без
+    событий дольше 2 * window вытесняются, всего не больше maxsize ключей.
+    """
+
+    def __init__(self, limit: int, window: float, maxsize: int = 100000):
+        self.limit = limit
+        self.window = float(window)
+        # ключ -> [номер интервала, счетчик предыдущего, счетчик текущего, отказов подряд]
+        self._entries = TTLCache(maxsize=maxsize, ttl=2 * self.window)
+        self._lock = threading.Lock()
+
+    def hit(self, key: Hashable) -> int:
+        """Засчитать событие. 0 - допущено, иначе номер отказа подряд (1 - первый)"""
+        now = time.monotonic()
+        interval, elapsed = divmod(now, self.window)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = [interval, 0, 0, 0]
+            elif entry[0] != interval:
+                previous = entry[2] if entry[0] == interval - 1 else 0
+                entry = [interval, previous, 0, entry[3]]
+            estimate = entry[1] * (1 - elapsed / self.window) + entry[2]
+            if estimate < self.limit:
+                entry[2] += 1
+                entry[3] = 0
+            else:
+                # отказы в окно не засчитываются: кто перестал флудить, быстро снова проходит
+                entry[3] += 1
+            self._entries.set(key, entry)
+            return entry[3]
@@ -0,0 +1,92 @@
+import datetime
+from typing import List, Optional
+# относительные импорты
+from .config import messages
+
+
+# Тексты постов: превью автору, заявка админам, публикация в канале, /stats, /queue, /pubqueue.
+# Общие для обоих рантаймов (bot.main и bot.async_main)
+
+
+def media_status(has_media: bool) -> str:
+    return messages.get('status.media_yes') if has_media else messages.get('status.media_no')
+
+
+def preview_text(data: dict, username: Optional[str]) -> str:
+    """Превью черновика из user_data для подтверждения автором"""
+    contact_info = messages.get('status.contact_anonymous') if data['is_anonymous'] else f'@{username}'
+    return messages.get('post_creation.confirmation',
+                        post_text=data['text'],
+                        media_status=media_status(data.get('has_photo', False) or data.get('has_video', False)),
+                        contact_info=contact_info)
+
+
+def moderation_text(post: dict, status: Optional[str] = None, admin_username: Optional[str] = None) -> str:
+    """Заявка для админов. status: None (новая) / approved / rejected.
+    Новая заявка берется из posts.moderation_text, если уже сохранена
+    """
+    if status is None and post.get('moderation_text'):
+        return post['moderation_text']
+    username = post["username"] if post["username"] else str(post["user_id"])
+    params = dict(
+        author=f"@{username} ({post['user_id']})",
+        post_id=post['id'],
+        post_text=post['text_content'],
+        media_status=media_status(post['has_photo'] or post['has_video']),
+        contact_info=messages.get('status.contact_anonymous') if post["is_anonymous"] else f"@{username}",
+    )
+    if status is None:
+        return messages.get('admin.new_application', **params)
+    if status == "approved":
+        return messages.get('admin.application_approved', admin_username=admin_username, **params)
+    return messages.get('admin.application_rejected', admin_username=admin_username, **params)
+
+
+def channel_text(post: dict) -> str:
+    """Текст публикации в канале (HTML), из posts.channel_text, если уже сохранен"""
+    if post.get('channel_text'):
+        return post['channel_text']
+    username = post["username"] if not post["is_anonymous"] else None
+    contact_info = f"@{username}" if username else messages.get('status.contact_anonymous')
+    return messages.get('channel_post.template',
+                        post_text=post['text_content'],
+                        author_info=contact_info)
+
+
+def stats_text(stats: dict, daily: List[dict]) -> str:
+    """Ответ на /stats: общие счетчики и разбивка по дням"""
+    return messages.get('stats.message',
+                        total_users=stats['users_count'],
+                        total_posts=stats['total_posts'],
+                        pending_posts=stats['pending_posts'],
+                        approved_posts=stats['approved_posts'],
+                        rejected_posts=stats['rejected_posts'],
+                        days="\n".join(messages.get('stats.day', **day) for day in daily))
+
+
+def _preview(post: dict) -> str:
+    preview = " ".join(post["text_content"].split())
+    return preview[:79] + "…" if len(preview) > 80 else preview
+
+
+def _author(post: dict) -> str:
+    return f"@{post['username']}" if post["username"] else str(post["user_id"])
+
+
+def queue_text(posts: List[dict]) -> str:
+    """Страница очереди модерации (/queue)"""
+    lines = [messages.get('queue.header', count=len(posts))]
+    for post in posts:
+        lines.append(messages.get('queue.item', post_id=post['id'], author=_author(post), preview=_preview(post)))
+    return "\n".join(lines)
+
+
+def publish_queue_text(posts: List[dict], total: int, next_time: datetime.datetime) -> str:
+    """Очередь публикации в канал (/pubqueue): первые посты и время следующего выхода"""
+    if not posts:
+        return messages.get('publish_queue.empty')
+    lines = [messages.get('publish_queue.header', count=total, next_time=next_time.strftime("%d.%m %H:%M"))]
+    for position, post in enumerate(posts, start=1):
+        lines.append(messages.get('publish_queue.item', position=position, post_id=post['id'],
+                                  author=_author(post), preview=_preview(post)))
+    return "\n".join(lines)
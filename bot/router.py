@@ -0,0 +1,76 @@
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+from telebot import types
+from .config import Messages
+
+
+class Router:
+    """Маршрутизация сообщений без цепочки лямбда-фильтров.
+
+    Текст кнопки -> хендлер ищется одним обращением к dict, тексты берутся
+    из каталога сообщений один раз (rebuild() - если каталог изменился).
+    Если кнопка не подошла, выбирается хендлер текущего состояния FSM
+    (одно чтение состояния на сообщение).
+    Работает и с обычными, и с async хендлерами: resolve() только находит
+    хендлер, вызывает его рантайм. Async рантайм читает состояние сам (не в
+    event loop) и вызывает resolve_button() / resolve_state() по отдельности.
+    """
+
+    def __init__(self, messages: Messages, get_state: Optional[Callable[[int], Optional[str]]] = None):
+        self.messages = messages
+        self.get_state = get_state
+        self._button_paths: List[Tuple[str, Callable]] = []
+        self._buttons: Dict[str, Callable] = {}
+        self._states: Dict[str, Tuple[Callable, FrozenSet[str]]] = {}
+
+    def button(self, *paths: str):
+        """Хендлер для кнопок с текстами messages.get(path)"""
+        def decorator(handler: Callable) -> Callable:
+            for path in paths:
+                self._button_paths.append((path, handler))
+                # как и с фильтрами telebot, срабатывает первый зарегистрированный
+                self._buttons.setdefault(self.messages.get(path), handler)
+            return handler
+        return decorator
+
+    def state(self, name: str, content_types: Iterable[str] = ('text',)):
+        """Хендлер для пользователей в состоянии name"""
+        def decorator(handler: Callable) -> Callable:
+            self._states[name] = (handler, frozenset(content_types))
+            return handler
+        return decorator
+
+    def rebuild(self):
+        """Пересобрать таблицу кнопок после изменения каталога сообщений"""
+        buttons: Dict[str, Callable] = {}
+        for path, handler in self._button_paths:
+            buttons.setdefault(self.messages.get(path), handler)
+        self._buttons = buttons
+
+    @property
+    def content_types(self) -> List[str]:
+        """Все типы сообщений, которые может обработать роутер"""
+        content_types = {'text'}
+        for _, state_content_types in self._states.values():
+            content_types |= state_content_types
+        return sorted(content_types)
+
+    def resolve(self, message: types.Message) -> Optional[Callable]:
+        handler = self.resolve_button(message)
+        if handler is None and self.has_states:
+            handler = self.resolve_state(message, self.get_state(message.from_user.id))
+        return handler
+
+    def resolve_button(self, message: types.Message) -> Optional[Callable]:
+        if message.content_type != 'text':
+            return None
+        return self._buttons.get(message.text)
+
+    @property
+    def has_states(self) -> bool:
+        return bool(self._states)
+
+    def resolve_state(self, message: types.Message, state: Optional[str]) -> Optional[Callable]:
+        route = self._states.get(state)
+        if route is not None and message.content_type in route[1]:
+            return route[0]
+        return None
@@ -0,0 +1,159 @@
+import datetime
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Optional, Tuple
+from .logger import logger
+from .cache import TTLCache
+from .database import Database
+
+
+_LOCK_STRIPES = 64
+# в кеше SqliteStateStore: "в БД для пользователя ничего нет"
+_NO_STATE = ()
+
+class StateStore(ABC):
+    """Хранилище состояния диалога (FSM) и черновика поста по user_id.
+
+    Черновик, который не менялся дольше ttl секунд, считается брошенным
+    и удаляется (лениво при чтении и фоново через start_expiry).
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._expiry_thread: Optional[threading.Thread] = None
+        # update() - чтение и запись черновика одной операцией; замки по
+        # user_id % _LOCK_STRIPES, чтобы запись одного черновика не ждала другие
+        self._locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+
+    @abstractmethod
+    def _load(self, user_id: int) -> Optional[Tuple[str, dict]]:
+        ...
+
+    @abstractmethod
+    def _save(self, user_id: int, state: str, data: dict):
+        ...
+
+    @abstractmethod
+    def clear(self, user_id: int):
+        ...
+
+    @abstractmethod
+    def purge_expired(self) -> int:
+        """Удалить брошенные черновики, вернуть их количество"""
+
+    def get_state(self, user_id: int) -> Optional[str]:
+        item = self._load(user_id)
+        return item[0] if item else None
+
+    def get_data(self, user_id: int) -> dict:
+        item = self._load(user_id)
+        return dict(item[1]) if item else {}
+
+    def set(self, user_id: int, state: str, data: Optional[dict] = None):
+        """Перейти в state с новым черновиком data (по умолчанию пустым)"""
+        self._save(user_id, state, dict(data or {}))
+
+    def update(self, user_id: int, state: Optional[str] = None, **fields) -> dict:
+        """Дописать поля черновика и, если задан, сменить state. Возвращает черновик"""
+        with self._locks[user_id % _LOCK_STRIPES]:
+            item = self._load(user_id)
+            current_state, data = item if item else (None, {})
+            data = {**data, **fields}
+            new_state = state or current_state
+            # нет активного диалога - нечего обновлять
+            if new_state is not None:
+                self._save(user_id, new_state, data)
+            return data
+
+    def start_expiry(self, interval: float = 600.0):
+        """Фоновая чистка брошенных черновиков раз в interval секунд"""
+        if self._expiry_thread is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    removed = self.purge_expired()
+                    if removed:
+                        logger.info(f"State store: {removed} abandoned drafts expired")
+                except Exception as e:
+                    logger.error(f"State store: ошибка при чистке черновиков: {e}")
+
+        self._expiry_thread = threading.Thread(target=loop, name="state-expiry", daemon=True)
+        self._expiry_thread.start()
+
+
+class MemoryStateStore(StateStore):
+    """В памяти процесса: TTL + LRU, не больше maxsize пользователей"""
+
+    def __init__(self, ttl: float, maxsize: int = 10000):
+        super().__init__(ttl)
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def _load(self, user_id: int) -> Optional[Tuple[str, dict]]:
+        return self._cache.get(user_id)
+
+    def _save(self, user_id: int, state: str, data: dict):
+        self._cache.set(user_id, (state, data))
+
+    def clear(self, user_id: int):
+        self._cache.pop(user_id)
+
+    def purge_expired(self) -> int:
+        return self._cache.purge_expired()
+
+
+class SqliteStateStore(StateStore):
+    """В таблице user_states: каждое изменение сразу пишется в БД (write-through),
+    черновики переживают перезапуск.
+
+    Перед БД - кеш процесса (TTL + LRU, не больше maxsize пользователей):
+    set/clear пишут в БД и в кеш, чтение идет в БД только при промахе.
+    Кешируется и отсутствие черновика, поэтому сообщения вне диалога БД
+    не читают. Изменения из другого процесса этот кеш не увидит -
+    один бот, один процесс.
+    """
+
+    def __init__(self, db: Database, ttl: float, maxsize: int = 10000):
+        super().__init__(ttl)
+        self.db = db
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def _expired_before(self) -> datetime.datetime:
+        return datetime.datetime.now() - datetime.timedelta(seconds=self.ttl)
+
+    def _load(self, user_id: int) -> Optional[Tuple[str, dict]]:
+        item = self._cache.get(user_id)
+        if item is not None:
+            return item or None
+
+        row = self.db.get_user_state(user_id, updated_after=self._expired_before())
+        if row is None:
+            self._cache.set(user_id, _NO_STATE)
+            return None
+        item = row['state'], json.loads(row['data'])
+        # в кеше не дольше, чем черновик проживет в БД
+        age = (datetime.datetime.now() - datetime.datetime.fromisoformat(row['updated_at'])).total_seconds()
+        self._cache.set(user_id, item, ttl=max(0.0, self.ttl - age))
+        return item
+
+    def _save(self, user_id: int, state: str, data: dict):
+        self.db.set_user_state(user_id, state, json.dumps(data, ensure_ascii=False))
+        self._cache.set(user_id, (state, data))
+
+    def clear(self, user_id: int):
+        self.db.delete_user_state(user_id)
+        self._cache.set(user_id, _NO_STATE)
+
+    def purge_expired(self) -> int:
+        self._cache.purge_expired()
+        return self.db.purge_user_states(self._expired_before())
+
+
+def create_state_store(backend: str, db: Database, ttl: float, maxsize: int) -> StateStore:
+    if backend == "sqlite":
+        return SqliteStateStore(db, ttl, maxsize)
+    return MemoryStateStore(ttl, maxsize)
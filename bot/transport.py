@@ -0,0 +1,84 @@
+import socket
+import threading
+import time
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter
+from telebot import apihelper
+from urllib3.connection import HTTPConnection
+from .logger import logger
+
+
+class _KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter с TCP keep-alive: простаивающие соединения не рвутся по дороге (NAT, балансировщики)"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = HTTPConnection.default_socket_options + [
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+        ]
+        super().init_poolmanager(*args, **kwargs)
+
+
+class HttpTransport:
+    """Общая сессия requests для всех потоков синхронного клиента telebot.
+
+    По умолчанию apihelper держит отдельную сессию на каждый поток и
+    пересоздает ее раз в 10 минут, а пул urllib3 рассчитан на 10 соединений:
+    лишние соединения выбрасываются, и TLS handshake повторяется.
+    install() подставляет одну сессию на весь процесс (apihelper.session,
+    без SESSION_TIME_TO_LIVE) с пулом pool_size соединений к api.telegram.org
+    и задает таймауты: connect_timeout на установку соединения, read_timeout
+    на ответ обычного метода, для getUpdates ответ ждется
+    long_polling_timeout + 5 секунд (так считает apihelper).
+    stats(): запросов, новых соединений (= TLS handshake) и переиспользований.
+    """
+
+    def __init__(self, pool_size: int = 32, connect_timeout: float = 5, read_timeout: float = 30,
+                 long_polling_timeout: int = 25):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.long_polling_timeout = long_polling_timeout
+        self.adapter = _KeepAliveAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self._stats_thread: Optional[threading.Thread] = None
+
+    def install(self):
+        """Все запросы telebot.TeleBot (и OutboundScheduler) идут через эту сессию"""
+        apihelper.session = self.session
+        apihelper.SESSION_TIME_TO_LIVE = None
+        apihelper.CONNECT_TIMEOUT = self.connect_timeout
+        apihelper.READ_TIMEOUT = self.read_timeout
+        apihelper.LONG_POLLING_TIMEOUT = self.long_polling_timeout
+
+    def stats(self) -> dict:
+        """Счетчики по всем пулам соединений сессии"""
+        requests_count = connections = 0
+        pools = self.adapter.poolmanager.pools
+        with pools.lock:
+            pool_list = [pools[key] for key in pools.keys()]
+        for pool in pool_list:
+            requests_count += pool.num_requests
+            connections += pool.num_connections
+        return {
+            'requests': requests_count,
+            'connections': connections,
+            'reused': max(0, requests_count - connections),
+        }
+
+    def start_stats_log(self, interval: float = 600.0):
+        """Писать счетчики в лог раз в interval секунд"""
+        if self._stats_thread is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                stats = self.stats()
+                logger.info(f"HTTP: {stats['requests']} requests, {stats['connections']} connections "
+                            f"(TLS handshakes), {stats['reused']} reused")
+
+        self._stats_thread = threading.Thread(target=loop, name="http-stats", daemon=True)
+        self._stats_thread.start()
@@ -0,0 +1,84 @@
+import hmac
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import telebot
+from telebot import types
+from .logger import logger
+
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class _UpdateHandler(BaseHTTPRequestHandler):
+    """Принимает POST от Telegram и сразу отвечает 200, обработка идет в пуле"""
+
+    def do_POST(self):
+        webhook: "WebhookServer" = self.server.webhook
+
+        if self.path != webhook.path:
+            self._reply(404)
+            return
+        if not hmac.compare_digest(self.headers.get(SECRET_HEADER, ""), webhook.secret):
+            self._reply(403)
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        try:
+            webhook.updates.put_nowait(body)
+        except queue.Full:
+            # Telegram повторит доставку позже
+            logger.warning("Webhook: update queue is full, asking Telegram to retry")
+            self._reply(503)
+            return
+        self._reply(200)
+
+    def _reply(self, code: int):
+        self.send_response(code)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        # access log на каждый апдейт не нужен
+        pass
+
+
+class WebhookServer:
+    """Встроенный HTTP сервер для приема апдейтов по webhook.
+
+    Апдейты складываются в ограниченную очередь в порядке получения, ее
+    разбирает один поток и передает в bot.process_new_updates (с
+    ShardedDispatcher - в очереди потоков диспетчера). Поток один, чтобы
+    апдейты одного пользователя попадали к диспетчеру в том же порядке;
+    хендлеры выполняются параллельно уже в потоках диспетчера.
+    """
+
+    def __init__(self, bot: telebot.TeleBot, host: str, port: int, path: str, secret: str,
+                 queue_size: int = 1000):
+        self.bot = bot
+        self.path = path
+        self.secret = secret
+        self.updates: "queue.Queue[bytes]" = queue.Queue(maxsize=queue_size)
+        self._feeder = threading.Thread(target=self._feed, name="webhook-feed", daemon=True)
+        self._httpd = ThreadingHTTPServer((host, port), _UpdateHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.webhook = self
+
+    def _feed(self):
+        while True:
+            body = self.updates.get()
+            try:
+                update = types.Update.de_json(body.decode("utf-8"))
+                self.bot.process_new_updates([update])
+            except Exception as e:
+                logger.error(f"Webhook: ошибка при обработке апдейта: {e}")
+
+    def serve_forever(self):
+        self._feeder.start()
+        host, port = self._httpd.server_address[:2]
+        logger.info(f"Webhook server listening on {host}:{port}{self.path}")
+        self._httpd.serve_forever()
+
+    def close(self):
+        self._httpd.server_close()
@@ -0,0 +1,93 @@
+"""Решение по заявке - compare-and-set: из одновременных approve / reject
+по одному посту проходит ровно одно, и задачи ставятся ровно один раз.
+
+    python -m pytest tests  (или python -m unittest discover tests)
+"""
+import os
+import tempfile
+import threading
+import unittest
+
+_tmp = tempfile.TemporaryDirectory(prefix="test-cas-")
+# модульный bot.database.db не должен создавать bot.db в текущей папке
+os.environ.setdefault("DB_PATH", os.path.join(_tmp.name, "module.db"))
+
+from bot.database import Database  # noqa: E402
+
+THREADS = 16
+ROUNDS = 30
+
+
+def _tasks(status: str, admin_id: int):
+    return [
+        ('edit_application', {'status': status, 'admin_username': str(admin_id)}),
+        ('notify_author', {'status': status}),
+    ]
+
+
+class ModerationCasTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Database(os.path.join(_tmp.name, f"{self.id()}.db"), pool_size=THREADS)
+        self.db.add_user(1, "author", "Author")
+
+    def tearDown(self):
+        self.db.close()
+
+    def _race(self, post_id: int) -> list:
+        """THREADS потоков одновременно одобряют / отклоняют пост, вернуть победителей"""
+        barrier = threading.Barrier(THREADS)
+        winners = []
+        lock = threading.Lock()
+
+        def decide(admin_id: int):
+            status = "approved" if admin_id % 2 else "rejected"
+            decide_post = self.db.approve_post if status == "approved" else self.db.reject_post
+            barrier.wait()
+            if decide_post(post_id, admin_id, tasks=_tasks(status, admin_id)):
+                with lock:
+                    winners.append((admin_id, status))
+
+        threads = [threading.Thread(target=decide, args=(admin_id,)) for admin_id in range(1, THREADS + 1)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return winners
+
+    def test_exactly_one_decision_wins(self):
+        for _ in range(ROUNDS):
+            post_id = self.db.create_post(1, "text")
+            winners = self._race(post_id)
+
+            self.assertEqual(len(winners), 1)
+            admin_id, status = winners[0]
+            post = self.db.get_post(post_id)
+            self.assertEqual(post['status'], status)
+            self.assertEqual(post['admin_decision_by'], admin_id)
+
+            with self.db.connection() as conn:
+                tasks = conn.execute(
+                    'SELECT kind, payload FROM moderation_tasks WHERE post_id = ? ORDER BY id', (post_id,)
+                ).fetchall()
+                queued = conn.execute(
+                    'SELECT COUNT(*) FROM publish_queue WHERE post_id = ?', (post_id,)
+                ).fetchone()[0]
+            # ровно один набор задач - победителя
+            self.assertEqual([row['kind'] for row in tasks], ['edit_application', 'notify_author'])
+            self.assertIn(f'"admin_username": "{admin_id}"', tasks[0]['payload'])
+            self.assertEqual(queued, 1 if status == "approved" else 0)
+
+    def test_decided_post_is_not_decided_again(self):
+        post_id = self.db.create_post(1, "text")
+        self.assertTrue(self.db.approve_post(post_id, 1, tasks=_tasks("approved", 1)))
+        self.assertFalse(self.db.reject_post(post_id, 2, tasks=_tasks("rejected", 2)))
+        self.assertFalse(self.db.approve_post(post_id, 3, tasks=_tasks("approved", 3)))
+        self.assertEqual(self.db.get_post(post_id)['status'], "approved")
+
+    def test_missing_post(self):
+        self.assertFalse(self.db.approve_post(10 ** 9, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+"""SqliteStateStore: запись сразу в БД и в кеш процесса, чтение из БД
+только при промахе кеша.
+
+    python -m pytest tests  (или python -m unittest discover tests)
+"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+_tmp = tempfile.TemporaryDirectory(prefix="test-state-")
+# модульный bot.database.db не должен создавать bot.db в текущей папке
+os.environ.setdefault("DB_PATH", os.path.join(_tmp.name, "module.db"))
+
+from bot.database import Database  # noqa: E402
+from bot.state import SqliteStateStore  # noqa: E402
+
+
+class SqliteStateStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Database(os.path.join(_tmp.name, f"{self.id()}.db"))
+        self.store = SqliteStateStore(self.db, ttl=3600)
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_reads_hit_cache_after_write(self):
+        self.store.set(1, "waiting_text", {"anonymous": True})
+        with mock.patch.object(self.db, "get_user_state", wraps=self.db.get_user_state) as get:
+            self.assertEqual(self.store.get_state(1), "waiting_text")
+            self.assertEqual(self.store.update(1, text="hi"), {"anonymous": True, "text": "hi"})
+            self.assertEqual(self.store.get_data(1), {"anonymous": True, "text": "hi"})
+        get.assert_not_called()
+
+    def test_missing_state_is_cached(self):
+        with mock.patch.object(self.db, "get_user_state", wraps=self.db.get_user_state) as get:
+            self.assertIsNone(self.store.get_state(2))
+            self.assertIsNone(self.store.get_state(2))
+        self.assertEqual(get.call_count, 1)
+
+    def test_writes_survive_restart(self):
+        self.store.set(3, "waiting_text")
+        self.store.update(3, text="draft")
+        self.store.clear(4)
+
+        restarted = SqliteStateStore(self.db, ttl=3600)
+        self.assertEqual(restarted.get_state(3), "waiting_text")
+        self.assertEqual(restarted.get_data(3), {"text": "draft"})
+
+        restarted.clear(3)
+        self.assertIsNone(SqliteStateStore(self.db, ttl=3600).get_state(3))
+
+
+if __name__ == "__main__":
+    unittest.main()
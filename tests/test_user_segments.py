@@ -0,0 +1,76 @@
+"""Сегмент рассылки "активные после даты" читается диапазоном
+idx_users_last_activity, а не перебором всех users.
+
+    python -m pytest tests  (или python -m unittest discover tests)
+"""
+import datetime
+import os
+import tempfile
+import unittest
+
+_tmp = tempfile.TemporaryDirectory(prefix="test-segments-")
+# модульный bot.database.db не должен создавать bot.db в текущей папке
+os.environ.setdefault("DB_PATH", os.path.join(_tmp.name, "module.db"))
+
+from bot.database import ACTIVE_USERS_PAGE, Database  # noqa: E402
+
+USERS = 60
+SINCE_DAYS = 10
+
+
+class UserSegmentsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Database(os.path.join(_tmp.name, f"{self.id()}.db"))
+        self.now = datetime.datetime.now()
+        with self.db.connection() as conn:
+            # пользователь i был активен i дней назад, каждый седьмой недоступен
+            conn.executemany('''
+                INSERT INTO users (telegram_id, last_activity, is_unreachable) VALUES (?, ?, ?)
+            ''', [
+                (1000 + i, self.now - datetime.timedelta(days=i), i % 7 == 0)
+                for i in range(USERS)
+            ])
+        self.since = self.now - datetime.timedelta(days=SINCE_DAYS, hours=12)
+
+    def tearDown(self):
+        self.db.close()
+
+    def _plan(self, where: str, params: list) -> str:
+        with self.db.connection() as conn:
+            rows = conn.execute('EXPLAIN QUERY PLAN ' + ACTIVE_USERS_PAGE.format(where=where),
+                                (self.since, 0, *params, 500)).fetchall()
+        return "\n".join(row[-1] for row in rows)
+
+    def test_segment_page_uses_activity_index(self):
+        plan = self._plan('is_banned = FALSE AND is_unreachable = FALSE', [])
+        self.assertIn('idx_users_last_activity', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_broadcast_segment_page_uses_activity_index(self):
+        where = '''is_banned = FALSE AND is_unreachable = FALSE AND id <= ?
+            AND NOT EXISTS (
+                SELECT 1 FROM broadcast_deliveries d
+                WHERE d.broadcast_id = ? AND d.user_id = users.telegram_id
+            )'''
+        plan = self._plan(where, [USERS, 1])
+        self.assertIn('idx_users_last_activity', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_segment_stream_pages_through_all_matches(self):
+        expected = {1000 + i for i in range(SINCE_DAYS + 1) if i % 7}
+        users = list(self.db.iter_users(active_since=self.since, page_size=3))
+        self.assertEqual(len(users), len(expected))
+        self.assertEqual(set(users), expected)
+
+    def test_broadcast_segment_skips_delivered(self):
+        broadcast_id, total = self.db.create_broadcast(1, "text", active_since=self.since)
+        recipients = list(self.db.iter_broadcast_recipients(broadcast_id, page_size=2))
+        self.assertEqual(len(recipients), total)
+        self.db.claim_broadcast_delivery(broadcast_id, recipients[0])
+        rest = list(self.db.iter_broadcast_recipients(broadcast_id, page_size=2))
+        self.assertEqual(set(rest), set(recipients[1:]))
+
+
+if __name__ == "__main__":
+    unittest.main()